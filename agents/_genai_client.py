@@ -0,0 +1,40 @@
+"""
+Process-wide Gemini client shared by the scenario and post-mortem agents.
+
+genai.Client() builds its own HTTP session, so constructing one per scenario
+or per post-mortem paid a fresh TLS handshake on the first request of every
+session. One shared instance (and its .aio side) keeps the connection warm.
+"""
+
+import os
+import threading
+from typing import Optional
+
+import httpx
+from google import genai
+
+# Pool for the sync side, which the scenario and post-mortem calls use. The
+# async side keeps the SDK's defaults since it may run on aiohttp, which
+# takes different arguments.
+_CLIENT_ARGS = {
+    "limits": httpx.Limits(
+        max_connections=int(os.getenv("GEMINI_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("GEMINI_MAX_KEEPALIVE", "32")),
+    ),
+}
+
+_lock = threading.Lock()
+_client: Optional[genai.Client] = None
+
+
+def get_genai_client() -> genai.Client:
+    """Returns the shared Gemini client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = genai.Client(
+                    api_key=os.getenv("GEMINI_API_KEY"),
+                    http_options=genai.types.HttpOptions(client_args=_CLIENT_ARGS),
+                )
+    return _client
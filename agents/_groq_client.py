@@ -0,0 +1,399 @@
+"""
+Process-wide Groq clients shared by every agent.
+
+Each Groq()/AsyncGroq() owns its own httpx connection pool, so building one
+per agent meant a fresh TCP/TLS handshake for every new session. Sharing a
+single instance lets all agents reuse the same keep-alive connections.
+"""
+
+import os
+import re
+import json
+import time
+import weakref
+import atexit
+import random
+import asyncio
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from groq import (
+    APIConnectionError,
+    AsyncGroq,
+    Groq,
+    InternalServerError,
+    RateLimitError,
+)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+# Speed tiers for picking a model by latency budget rather than by name
+SPEED_MAP = {
+    "instant": "llama-3.1-8b-instant",
+    "balanced": "llama-3.3-70b-versatile",
+    "specdec": "llama-3.3-70b-specdec",
+}
+
+
+def resolve_model(tier_or_model: str) -> str:
+    """Maps a SPEED_MAP tier to its model; anything else is taken as a model id."""
+    return SPEED_MAP.get(tier_or_model, tier_or_model)
+
+
+@lru_cache(maxsize=None)
+def _encoding():
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str) -> int:
+    """Token count for budgeting; a chars/4 estimate when tiktoken is missing."""
+    if tiktoken is None:
+        return len(text) // 4 + 1
+    return len(_encoding().encode(text))
+
+
+# One pool for every agent; HTTP/2 (when h2 is installed) lets concurrent
+# coach and opponent requests multiplex over a single connection
+_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("GROQ_MAX_CONNECTIONS", "100")),
+    max_keepalive_connections=int(os.getenv("GROQ_MAX_KEEPALIVE", "50")),
+)
+
+# Retry policy for chat completions. The SDK's own retries are turned off so
+# this is the only place that decides when to back off or switch models.
+MAX_ATTEMPTS = int(os.getenv("GROQ_MAX_ATTEMPTS", "4"))
+# Rate-limited attempts on the requested model before moving to the fallback
+PRIMARY_ATTEMPTS = int(os.getenv("GROQ_PRIMARY_ATTEMPTS", "2"))
+BACKOFF_BASE = float(os.getenv("GROQ_BACKOFF_BASE", "0.5"))
+BACKOFF_CAP = float(os.getenv("GROQ_BACKOFF_CAP", "8"))
+# Proactive cap on requests in flight per process (0 = unlimited)
+MAX_IN_FLIGHT = int(os.getenv("GROQ_MAX_IN_FLIGHT", "32"))
+# Transient failures worth another attempt (APITimeoutError is an APIConnectionError)
+_RETRYABLE = (RateLimitError, APIConnectionError, InternalServerError)
+
+# Groq reset headers look like "7.66s", "2m59.56s" or "250ms"
+_DURATION_PART = re.compile(r"([\d.]+)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+_lock = threading.Lock()
+_client: Optional[Groq] = None
+_async_client: Optional[AsyncGroq] = None
+
+
+def get_client() -> Groq:
+    """Returns the shared sync Groq client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = Groq(
+                    api_key=os.getenv("GROQ_API_KEY"),
+                    max_retries=0,
+                    http_client=httpx.Client(limits=_LIMITS, http2=_HTTP2),
+                )
+    return _client
+
+
+def get_async_client() -> AsyncGroq:
+    """Returns the shared AsyncGroq client, creating it on first use."""
+    global _async_client
+    if _async_client is None:
+        with _lock:
+            if _async_client is None:
+                _async_client = AsyncGroq(
+                    api_key=os.getenv("GROQ_API_KEY"),
+                    max_retries=0,
+                    http_client=httpx.AsyncClient(limits=_LIMITS, http2=_HTTP2),
+                )
+    return _async_client
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def _server_delay(error: Exception) -> Optional[float]:
+    """Wait suggested by Retry-After or the x-ratelimit-reset-* headers, if any."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    for name in ("retry-after", "x-ratelimit-reset-tokens", "x-ratelimit-reset-requests"):
+        value = headers.get(name)
+        if value:
+            delay = _parse_duration(value)
+            if delay is not None:
+                return delay
+    return None
+
+
+def _backoff(attempt: int) -> float:
+    # Jitter spreads retries from concurrent sessions apart
+    return min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt) * (0.5 + random.random() * 0.5)
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    if isinstance(error, RateLimitError):
+        return True
+    return isinstance(error, httpx.HTTPStatusError) and error.response.status_code == 429
+
+
+def _raw_retryable(error: Exception) -> bool:
+    """Raw HTTP counterpart of _RETRYABLE: 429, 5xx and transport failures."""
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+def _plan_retry(error: Exception, attempt: int, model: str, fallback_model: str) -> Tuple[str, float]:
+    """Returns (model for the next attempt, seconds to wait before it)."""
+    suggested = _server_delay(error)
+    if _is_rate_limited(error) and model != fallback_model:
+        # A long server-side wait means the quota is gone for a while;
+        # the fallback model has its own limits, so switch without waiting
+        if attempt + 1 >= PRIMARY_ATTEMPTS or (suggested or 0) > BACKOFF_CAP:
+            return fallback_model, 0.0
+    if suggested is not None:
+        return model, min(suggested, BACKOFF_CAP)
+    return model, _backoff(attempt)
+
+
+_sync_slots = threading.BoundedSemaphore(MAX_IN_FLIGHT) if MAX_IN_FLIGHT > 0 else None
+# asyncio primitives belong to one loop, so keep a semaphore per loop
+_async_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def _loop_slots() -> Optional[asyncio.Semaphore]:
+    if MAX_IN_FLIGHT <= 0:
+        return None
+    loop = asyncio.get_running_loop()
+    slots = _async_slots.get(loop)
+    if slots is None:
+        slots = _async_slots[loop] = asyncio.Semaphore(MAX_IN_FLIGHT)
+    return slots
+
+
+def create_completion(client: Groq, fallback_model: str, **kwargs):
+    """
+    chat.completions.create with bounded retries.
+
+    Rate limits retry the requested model up to PRIMARY_ATTEMPTS times, then
+    move to fallback_model; timeouts, connection errors and 5xx back off and
+    retry. Waits honour Retry-After / x-ratelimit-reset-* when sent, else use
+    capped exponential backoff with jitter. At most MAX_IN_FLIGHT requests
+    are started concurrently.
+    """
+    model = kwargs.pop("model")
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            if _sync_slots is None:
+                return client.chat.completions.create(model=model, **kwargs)
+            with _sync_slots:
+                return client.chat.completions.create(model=model, **kwargs)
+        except _RETRYABLE as e:
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+            model, delay = _plan_retry(e, attempt, model, fallback_model)
+            if delay:
+                time.sleep(delay)
+
+
+async def acreate_completion(client: AsyncGroq, fallback_model: str, **kwargs):
+    """Async variant of create_completion."""
+    model = kwargs.pop("model")
+    slots = _loop_slots()
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            if slots is None:
+                return await client.chat.completions.create(model=model, **kwargs)
+            async with slots:
+                return await client.chat.completions.create(model=model, **kwargs)
+        except _RETRYABLE as e:
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+            model, delay = _plan_retry(e, attempt, model, fallback_model)
+            if delay:
+                await asyncio.sleep(delay)
+
+
+# Thin OpenAI-compatible HTTP path for small, non-streaming hot-path calls.
+# Skips the SDK's pydantic request/response models and only reads the reply
+# text; orjson is used for (de)serialisation when installed.
+
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
+
+_http_client: Optional[httpx.Client] = None
+_async_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _http_options() -> dict:
+    return {
+        "base_url": GROQ_BASE_URL,
+        "headers": {
+            "Authorization": f"Bearer {os.getenv('GROQ_API_KEY')}",
+            "Content-Type": "application/json",
+        },
+        "timeout": httpx.Timeout(30.0, connect=5.0),
+        "limits": _LIMITS,
+        "http2": _HTTP2,
+    }
+
+
+def _dumps(body: dict) -> bytes:
+    return orjson.dumps(body) if orjson else json.dumps(body).encode()
+
+
+def _reply_text(raw: bytes) -> str:
+    data = orjson.loads(raw) if orjson else json.loads(raw)
+    return data["choices"][0]["message"]["content"] or ""
+
+
+def serialize_message(message: Dict[str, str]) -> bytes:
+    """Pre-serializes a static message (e.g. a system prompt) for reuse as a request head."""
+    return _dumps(message)
+
+
+def _completion_body(
+    model: str,
+    messages: List[Dict[str, str]],
+    temperature: float,
+    max_tokens: int,
+    head: Optional[bytes] = None,
+    **extra,
+) -> bytes:
+    params = {"model": model, "temperature": temperature, "max_tokens": max_tokens, **extra}
+    if head is None:
+        return _dumps({**params, "messages": messages})
+    # Splice the pre-serialized head in front of the per-turn messages so
+    # the large static prompt is never re-encoded
+    parts = [head, *(_dumps(m) for m in messages)]
+    return _dumps(params)[:-1] + b',"messages":[' + b",".join(parts) + b"]}"
+
+
+def get_http_client() -> httpx.Client:
+    """Returns the shared raw HTTP client, creating it on first use."""
+    global _http_client
+    if _http_client is None:
+        with _lock:
+            if _http_client is None:
+                _http_client = httpx.Client(**_http_options())
+    return _http_client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Returns the shared raw async HTTP client, creating it on first use."""
+    global _async_http_client
+    if _async_http_client is None:
+        with _lock:
+            if _async_http_client is None:
+                _async_http_client = httpx.AsyncClient(**_http_options())
+    return _async_http_client
+
+
+def raw_completion_text(
+    model: str,
+    messages: List[Dict[str, str]],
+    temperature: float,
+    max_tokens: int,
+    head: Optional[bytes] = None,
+    headers: Optional[Dict[str, str]] = None,
+    fallback_model: Optional[str] = None,
+    **extra,
+) -> str:
+    """
+    POSTs a chat completion directly and returns only the reply text.
+
+    head is an optional serialize_message() blob sent before messages.
+    Retries follow create_completion (fallback_model defaults to model);
+    the last failure is raised as httpx.HTTPStatusError or TransportError.
+    """
+    fallback_model = fallback_model or model
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            body = _completion_body(model, messages, temperature, max_tokens, head, **extra)
+            if _sync_slots is None:
+                response = get_http_client().post("/chat/completions", content=body, headers=headers)
+            else:
+                with _sync_slots:
+                    response = get_http_client().post("/chat/completions", content=body, headers=headers)
+            response.raise_for_status()
+            return _reply_text(response.content)
+        except Exception as e:
+            if attempt == MAX_ATTEMPTS - 1 or not _raw_retryable(e):
+                raise
+            model, delay = _plan_retry(e, attempt, model, fallback_model)
+            if delay:
+                time.sleep(delay)
+
+
+async def araw_completion_text(
+    model: str,
+    messages: List[Dict[str, str]],
+    temperature: float,
+    max_tokens: int,
+    head: Optional[bytes] = None,
+    headers: Optional[Dict[str, str]] = None,
+    fallback_model: Optional[str] = None,
+    **extra,
+) -> str:
+    """Async variant of raw_completion_text."""
+    fallback_model = fallback_model or model
+    slots = _loop_slots()
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            body = _completion_body(model, messages, temperature, max_tokens, head, **extra)
+            if slots is None:
+                response = await get_async_http_client().post("/chat/completions", content=body, headers=headers)
+            else:
+                async with slots:
+                    response = await get_async_http_client().post("/chat/completions", content=body, headers=headers)
+            response.raise_for_status()
+            return _reply_text(response.content)
+        except Exception as e:
+            if attempt == MAX_ATTEMPTS - 1 or not _raw_retryable(e):
+                raise
+            model, delay = _plan_retry(e, attempt, model, fallback_model)
+            if delay:
+                await asyncio.sleep(delay)
+
+
+@atexit.register
+def _close_clients() -> None:
+    """Closes the shared pools at interpreter exit."""
+    for client in (_client, _http_client):
+        if client is not None:
+            client.close()
+    async_clients = [c for c in (_async_client, _async_http_client) if c is not None]
+    if async_clients:
+        async def _aclose():
+            for client in async_clients:
+                await (client.close() if isinstance(client, AsyncGroq) else client.aclose())
+        try:
+            asyncio.run(_aclose())
+        except RuntimeError:
+            # The loop that owned the connections is already gone
+            pass
@@ -0,0 +1,60 @@
+"""
+JSON helpers shared by the agents that parse LLM output.
+"""
+
+import json
+from typing import Any, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(text: str) -> Any:
+    """json.loads, through orjson when it is installed; both raise json.JSONDecodeError."""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def dumps_compact(value: Any) -> str:
+    """Compact JSON with non-ASCII text kept as-is, for prompts."""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def extract_first_json_object(text: str) -> Optional[str]:
+    """
+    Returns the first balanced {...} object in text, or None.
+
+    A single linear pass tracking brace depth, skipping braces inside
+    strings. Unlike a greedy first-{-to-last-} match it cannot backtrack,
+    and it stops at the end of the first object instead of handing any
+    trailing text to json.loads.
+    """
+    depth = 0
+    start = -1
+    in_string = False
+    escape = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            if depth:
+                in_string = True
+        elif ch == "{":
+            if depth == 0:
+                start = i
+            depth += 1
+        elif ch == "}" and depth:
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
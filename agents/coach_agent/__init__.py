@@ -1,2 +1,2 @@
 # Coach agent
-from .coach import CoachAgent
+from .coach import CoachAgent, batch_final_advice
@@ -1,6 +1,185 @@
 import os
-from typing import List, Dict, Optional
-from groq import Groq
+import re
+import zlib
+import asyncio
+import logging
+from dataclasses import asdict, dataclass
+from functools import cached_property, lru_cache
+from string import Template
+from typing import Iterator, List, Dict, Optional, Tuple
+
+from agents._groq_client import (
+    acreate_completion,
+    araw_completion_text,
+    count_tokens,
+    create_completion,
+    get_async_client,
+    get_client,
+    raw_completion_text,
+    resolve_model,
+)
+
+try:
+    import numpy as np
+    import onnxruntime as ort
+except ImportError:
+    np = None
+    ort = None
+
+try:
+    import faiss
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    faiss = None
+    SentenceTransformer = None
+
+logger = logging.getLogger(__name__)
+
+# Display label per transcript role; anything else is the opponent
+_ROLE_MAP = {"user": "User"}
+
+# Coach's no-tip sentinel, in any case and wrapping ("PASS", **Pass**, ...)
+_PASS_RE = re.compile(r"PASS", re.IGNORECASE)
+
+# Split point between complete sentences in streamed text
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+# Coach system prompt. The invariant rubric comes first so it forms a prefix
+# shared by every scenario; only the context block below it varies.
+_COACH_TEMPLATE = Template("""You are an expert negotiation coach watching a live practice negotiation.
+
+When you speak, format as:
+"💡 [2-3 word label]: [One sentence explaining what just happened and why it matters]. Say: \"[Exact words the user can say next]\""
+
+Keep it under 200 characters total. The user needs to act fast—no lengthy explanations.
+
+If nothing warrants a tip, respond with just "PASS".
+
+SCENARIO CONTEXT:
+
+User's Objectives: $user_objectives
+User's BATNA (walkaway alternative): $user_batna
+Points of Tension: $tensions
+What's Negotiable: $negotiable
+Success Criteria: $success_criteria
+Information Asymmetries: $info_asymmetries""")
+
+_FINAL_TEMPLATE = Template("""You are a negotiation coach providing final performance feedback.
+
+Provide a structured performance review covering:
+1. What they did well (specific tactics or moves)
+2. What they could improve (missed opportunities, mistakes)
+3. How close they got to the success criteria
+4. One key lesson to take to their next negotiation
+
+Keep it to 4-5 sentences. Be honest but constructive.
+
+SCENARIO CONTEXT:
+User's Objectives: $user_objectives
+User's BATNA: $user_batna
+Success Criteria: $success_criteria""")
+
+# Invariant tail of the per-turn analysis trigger
+_ANALYSIS_SUFFIX = """
+
+Based on the phase instructions above, decide whether the latest exchange warrants a tip or respond "PASS"."""
+
+# Appended to the trigger for the cheap first-stage gate
+_GATE_SUFFIX = """
+
+Do not write the tip yet. Reply with only PASS, or ACT:<one-word tactic> if a tip is warranted."""
+
+_SUMMARY_PROMPT = """Summarize these negotiation turns in a few short bullet points.
+Preserve every number, offer, concession and commitment. No commentary."""
+
+
+_GATE_WORD = re.compile(r"[a-z0-9$%']+")
+
+# Cheap local signal that an exchange might deserve a tip: deadlines, final
+# offers, walkaways, acceptance and any figure (the opponent speaks numbers
+# as words for TTS, so those count too).
+_TIP_TRIGGER = re.compile(
+    r"\b(final|last|deadline|walk(?:ing)? away|best I can|accept|deal|offer|counter"
+    r"|bottom line|won't|can't|cannot|hundred|thousand|million|percent|dollars?)\b"
+    r"|\$[\d,]+|\d|%",
+    re.IGNORECASE,
+)
+
+
+@lru_cache(maxsize=None)
+def _load_local_gate(path: str):
+    """Loads an ONNX gate once per process; returns (session, input name, width)."""
+    session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+    model_input = session.get_inputs()[0]
+    return session, model_input.name, model_input.shape[-1]
+
+
+def _local_gate_probability(path: str, text: str) -> float:
+    """
+    Scores how likely a window of the exchange is to deserve a tip.
+
+    The model is a binary classifier over hashed bag-of-words features: it
+    takes a float32 [1, width] L2-normalised count vector (word bucket =
+    crc32(word) % width) and its last output holds class probabilities,
+    the last column being P(tip). Export sklearn models with zipmap=False.
+    """
+    session, input_name, width = _load_local_gate(path)
+    features = np.zeros((1, width), dtype=np.float32)
+    for word in _GATE_WORD.findall(text.lower()):
+        features[0, zlib.crc32(word.encode()) % width] += 1.0
+    norm = np.linalg.norm(features)
+    if norm:
+        features /= norm
+    outputs = session.run(None, {input_name: features})
+    return float(np.asarray(outputs[-1], dtype=np.float32).reshape(-1)[-1])
+
+
+@lru_cache(maxsize=None)
+def _load_embedder(name: str):
+    """Loads a sentence-transformers model once per process."""
+    return SentenceTransformer(name)
+
+
+def _norm(value) -> str:
+    """Strips each line and collapses blank lines and runs of spaces."""
+    lines = (" ".join(line.split()) for line in str(value).splitlines())
+    return "\n".join(line for line in lines if line) or "(none)"
+
+
+@dataclass(slots=True, frozen=True)
+class ScenarioCtx:
+    """The user's side of the scenario as the coach sees it, normalized."""
+
+    user_objectives: str
+    user_batna: str
+    tensions: str
+    negotiable: str
+    success_criteria: str
+    info_asymmetries: str
+
+    @classmethod
+    def from_scenario(cls, scenario_data: Dict) -> "ScenarioCtx":
+        # Normalized so equivalent scenarios render byte-identical prompts
+        return cls(
+            user_objectives=_norm(scenario_data.get("user_objectives", "")),
+            user_batna=_norm(scenario_data.get("user_batna", "")),
+            tensions=_norm(scenario_data.get("points_of_tension", "")),
+            negotiable=_norm(scenario_data.get("negotiable_items", "")),
+            success_criteria=_norm(scenario_data.get("success_criteria", "")),
+            info_asymmetries=_norm(scenario_data.get("info_asymmetries", "")),
+        )
+
+
+@dataclass(slots=True)
+class _TipRequest:
+    """One tip request, from claiming the new messages to storing the answer."""
+
+    messages: List[Dict[str, str]]
+    trigger: str
+    max_tokens: int
+    checkpoint: int
+    embedding: object
+    cached: Optional[str]
 
 
 class CoachAgent:
@@ -36,41 +215,85 @@ class CoachAgent:
                 - success_criteria: What defines a good outcome
                 - info_asymmetries: What you know vs. what they know
         """
-        self.client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+        self.client = get_client()
+        self.aclient = get_async_client()
         self.model = os.getenv("GROQ_COACH_MODEL", "llama-3.1-8b-instant")
         self.fallback_model = os.getenv("GROQ_COACH_FALLBACK_MODEL", "llama-3.1-8b-instant")
+        # The end-of-session review isn't latency-sensitive, so it gets the bigger model
+        self.final_model = resolve_model(os.getenv("GROQ_COACH_FINAL_MODEL", "balanced"))
         self.max_tip_tokens = int(os.getenv("GROQ_COACH_TIP_TOKENS", "80"))
+        # Later phases mostly PASS or give one short line, so cap them tighter
+        self.max_late_tip_tokens = int(os.getenv("GROQ_COACH_LATE_TIP_TOKENS", "60"))
+        self.context_tokens = int(os.getenv("GROQ_COACH_CONTEXT_TOKENS", "131072"))
+        # Tip requests see a window of recent messages whose start moves
+        # GROQ_COACH_HISTORY messages at a time (N to 2N-1 kept), or earlier
+        # by whole exchanges once the window passes GROQ_COACH_HISTORY_TOKENS
+        self.history_messages = int(os.getenv("GROQ_COACH_HISTORY", "6"))
+        self.history_tokens = int(os.getenv("GROQ_COACH_HISTORY_TOKENS", "2048"))
         self.max_final_tokens = int(os.getenv("GROQ_COACH_FINAL_TOKENS", "120"))
+        self.final_budget_chars = int(os.getenv("GROQ_COACH_FINAL_BUDGET_CHARS", "8000"))
+        self.max_summary_tokens = int(os.getenv("GROQ_COACH_SUMMARY_TOKENS", "150"))
+        # Deterministic tips keep sessions replayable and semantic-cache hits consistent
+        self.tip_temperature = float(os.getenv("GROQ_COACH_TIP_TEMPERATURE", "0.0"))
+        # Send tip/gate requests over plain HTTP instead of through the SDK
+        self.raw_http = os.getenv("GROQ_COACH_RAW_HTTP", "0") == "1"
+        self.max_gate_tokens = int(os.getenv("GROQ_COACH_GATE_TOKENS", "20"))
+        # First turn the keyword pre-filter applies to (0 = always)
+        self.heuristic_min_turn = int(os.getenv("GROQ_COACH_HEURISTIC_MIN_TURN", "4"))
+        self.local_gate_path = os.getenv("GROQ_COACH_GATE_ONNX", "")
+        self.local_gate_threshold = float(os.getenv("GROQ_COACH_GATE_THRESHOLD", "0.25"))
+        if self.local_gate_path and ort is None:
+            logger.warning("GROQ_COACH_GATE_ONNX is set but onnxruntime/numpy are not installed; local gate disabled.")
+            self.local_gate_path = ""
+        # Semantic tip cache: reuse a tip when a near-identical exchange recurs
+        self.semantic_model = os.getenv("GROQ_COACH_SEMANTIC_CACHE_MODEL", "")
+        self.semantic_threshold = float(os.getenv("GROQ_COACH_SEMANTIC_THRESHOLD", "0.92"))
+        self.semantic_window = int(os.getenv("GROQ_COACH_SEMANTIC_WINDOW", "6"))
+        if self.semantic_model and faiss is None:
+            logger.warning("GROQ_COACH_SEMANTIC_CACHE_MODEL is set but faiss/sentence-transformers are not installed; semantic cache disabled.")
+            self.semantic_model = ""
         self.last_analyzed_turn = 0
 
         # Extract scenario context
-        self.user_objectives = scenario_data.get("user_objectives", "")
-        self.user_batna = scenario_data.get("user_batna", "")
-        self.tensions = scenario_data.get("points_of_tension", "")
-        self.negotiable = scenario_data.get("negotiable_items", "")
-        self.success_criteria = scenario_data.get("success_criteria", "")
-        self.info_asymmetries = scenario_data.get("info_asymmetries", "")
+        self.ctx = ScenarioCtx.from_scenario(scenario_data)
 
-        self.system_prompt = self._build_system_prompt()
+        # Prompt layout: [static system] -> [committed history] -> [dynamic trigger].
+        # Between window snaps the first two only grow at the tail so the
+        # provider prompt cache can reuse everything up to the trigger message.
+        # System prompts themselves are built lazily on first use.
+        self._committed_messages: List[Dict[str, str]] = []
+        self._reset_committed()
 
-    def _build_system_prompt(self) -> str:
-        return f"""You are an expert negotiation coach watching a live practice negotiation.
+        # Formatted transcript lines keyed by id() of the message dict
+        self._line_cache: Dict[int, Tuple[Dict, bool, str]] = {}
 
-SCENARIO CONTEXT:
+        self._reset_semantic()
 
-User's Objectives: {self.user_objectives}
-User's BATNA (walkaway alternative): {self.user_batna}
-Points of Tension: {self.tensions}
-What's Negotiable: {self.negotiable}
-Success Criteria: {self.success_criteria}
-Information Asymmetries: {self.info_asymmetries}
+    @cached_property
+    def system_prompt(self) -> str:
+        return self._build_system_prompt()
 
-When you speak, format as:
-"💡 [2-3 word label]: [One sentence explaining what just happened and why it matters]. Say: \"[Exact words the user can say next]\""
+    @cached_property
+    def _final_system_prompt(self) -> str:
+        return self._build_final_system_prompt()
 
-Keep it under 200 characters total. The user needs to act fast—no lengthy explanations.
+    @cached_property
+    def _system_messages(self) -> List[Dict[str, str]]:
+        return [{"role": "system", "content": self.system_prompt}]
+
+    @cached_property
+    def _final_system_msg(self) -> Dict[str, str]:
+        return {"role": "system", "content": self._final_system_prompt}
+
+    @cached_property
+    def _system_tokens(self) -> int:
+        return count_tokens(self.system_prompt)
 
-If nothing warrants a tip, respond with just "PASS"."""
+    def _build_system_prompt(self) -> str:
+        return _COACH_TEMPLATE.substitute(asdict(self.ctx))
+
+    def _build_final_system_prompt(self) -> str:
+        return _FINAL_TEMPLATE.substitute(asdict(self.ctx))
 
     def _get_phase_instructions(self, turn_number: int) -> str:
         """Returns coaching instructions based on negotiation phase."""
@@ -138,114 +361,542 @@ Trust the user to handle the endgame. Your default response is "PASS"."""
         Returns:
             Coaching tip string, or None if nothing significant happened
         """
-        # Only analyze if there are new messages
-        if len(transcript) <= self.last_analyzed_turn:
+        request = self._begin_tip(transcript)
+        if request is None:
             return None
+        if request.cached is not None:
+            return self._filter_tip(request.cached)
+        if self._gate_says_pass(request.messages):
+            return self._finish_tip(request, "PASS")
+        try:
+            tip = self._complete_text(
+                model=self.model,
+                messages=request.messages,
+                temperature=self.tip_temperature,
+                max_tokens=request.max_tokens,
+            )
+        except Exception:
+            self.last_analyzed_turn = request.checkpoint
+            raise
+        return self._finish_tip(request, tip)
 
-        # Get last 6 messages (3 exchanges) for better context on patterns
-        recent_messages = transcript[-6:] if len(transcript) >= 6 else transcript
+    async def analyze_turn_async(self, transcript: List[Dict]) -> Optional[str]:
+        """
+        Async variant of analyze_turn.
 
-        # Determine current turn number from transcript
-        current_turn = len(transcript) // 2  # Approximate turn count (2 messages per turn)
-        if transcript and "turn" in transcript[-1]:
-            current_turn = transcript[-1]["turn"]
+        Lets the caller keep the event loop busy (opponent reply, TTS) while
+        the coach model decodes in the background.
+        """
+        request = self._begin_tip(transcript)
+        if request is None:
+            return None
+        if request.cached is not None:
+            return self._filter_tip(request.cached)
+        if await self._agate_says_pass(request.messages):
+            return self._finish_tip(request, "PASS")
+        try:
+            tip = await self._acomplete_text(
+                model=self.model,
+                messages=request.messages,
+                temperature=self.tip_temperature,
+                max_tokens=request.max_tokens,
+            )
+        except Exception:
+            self.last_analyzed_turn = request.checkpoint
+            raise
+        return self._finish_tip(request, tip)
 
-        # Get phase-appropriate instructions
-        phase_instructions = self._get_phase_instructions(current_turn)
+    def analyze_turn_stream(self, transcript: List[Dict]) -> Iterator[str]:
+        """
+        Streaming variant of analyze_turn.
 
-        # Build analysis prompt with phase context
-        analysis_prompt = f"""{phase_instructions}
+        Yields tip text as it is generated. Nothing is yielded when the coach
+        passes; the stream is closed as soon as the "PASS" sentinel shows up
+        so the remaining tokens are never decoded.
+        """
+        request = self._begin_tip(transcript)
+        if request is None:
+            return
+        if request.cached is not None:
+            tip = self._filter_tip(request.cached)
+            if tip:
+                yield tip
+            return
+        if self._gate_says_pass(request.messages):
+            self._finish_tip(request, "PASS")
+            return
 
-RECENT EXCHANGE:
-{self._format_transcript(recent_messages)}
+        try:
+            stream = self._create_completion(
+                model=self.model,
+                messages=request.messages,
+                temperature=self.tip_temperature,
+                max_tokens=request.max_tokens,
+                stream=True,
+            )
+        except Exception:
+            self.last_analyzed_turn = request.checkpoint
+            raise
+        parts: List[str] = []
+        # Text is held back until it is long enough to rule out a PASS
+        held: Optional[str] = ""
+        try:
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                parts.append(delta)
+                if held is None:
+                    yield delta
+                    continue
+
+                held += delta
+                if len(held.lstrip()) < 10:
+                    continue
+                if self._filter_tip(held.strip()) is None:
+                    # The stream is dropped here, so the PASS is the final answer
+                    self._finish_tip(request, held.strip())
+                    return
+                yield held.lstrip()
+                held = None
+        except Exception:
+            self.last_analyzed_turn = request.checkpoint
+            raise
+        else:
+            # Cached once, with the whole tip, so a hit never serves a prefix
+            tip = self._finish_tip(request, "".join(parts).strip())
+            if held is not None and tip:
+                yield tip
+        finally:
+            stream.close()
 
-Based on the phase instructions above, decide whether to provide a tip or respond "PASS"."""
+    def get_final_advice(self, transcript: List[Dict]) -> str:
+        """
+        Provides comprehensive performance review at the end of negotiation.
 
+        Args:
+            transcript: Full transcript from NegotiationSession.get_transcript()
+
+        Returns:
+            Final feedback and advice string
+        """
         response = self._create_completion(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": self.system_prompt},
-                {"role": "user", "content": analysis_prompt}
-            ],
-            temperature=0.4,  # Slightly higher for more varied early-phase responses
-            max_tokens=self.max_tip_tokens,
+            model=self.final_model,
+            messages=self._build_final_messages(transcript),
+            temperature=0.7,
+            max_tokens=self.max_final_tokens,
         )
 
-        tip = (response.choices[0].message.content or "").strip()
+        return response.choices[0].message.content
 
-        # Update last analyzed position
-        self.last_analyzed_turn = len(transcript)
+    async def get_final_advice_async(self, transcript: List[Dict]) -> str:
+        """Async variant of get_final_advice."""
+        # Compacting a long transcript may itself call the model
+        messages = await asyncio.to_thread(self._build_final_messages, transcript)
+        response = await self._acreate_completion(
+            model=self.final_model,
+            messages=messages,
+            temperature=0.7,
+            max_tokens=self.max_final_tokens,
+        )
 
-        # Return None if coach passes (check various forms)
-        tip_upper = tip.upper()
-        if tip_upper == "PASS" or tip_upper.startswith("PASS") or "PASS" in tip_upper[:10]:
-            return None
+        return response.choices[0].message.content
 
-        return tip
+    def get_final_advice_stream(self, transcript: List[Dict]) -> Iterator[str]:
+        """
+        Streaming variant of get_final_advice.
 
-    def get_final_advice(self, transcript: List[Dict]) -> str:
+        Yields the review one sentence at a time so TTS can start speaking
+        before the whole review has been generated.
         """
-        Provides comprehensive performance review at the end of negotiation.
+        stream = self._create_completion(
+            model=self.final_model,
+            messages=self._build_final_messages(transcript),
+            temperature=0.7,
+            max_tokens=self.max_final_tokens,
+            stream=True,
+        )
+        buffer = ""
+        try:
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                buffer += delta
+                *sentences, buffer = _SENTENCE_END.split(buffer)
+                for sentence in sentences:
+                    if sentence.strip():
+                        yield sentence.strip()
+        finally:
+            stream.close()
+
+        if buffer.strip():
+            yield buffer.strip()
+
+    def _build_analysis_messages(self, transcript: List[Dict]) -> List[Dict[str, str]]:
+        """Builds the analyze_turn request: static prefix first, phase trigger last."""
+        # Get phase-appropriate instructions
+        phase_instructions = self._get_phase_instructions(self._current_turn(transcript))
 
-        Args:
-            transcript: Full transcript from NegotiationSession.get_transcript()
+        self._commit_transcript(transcript)
 
-        Returns:
-            Final feedback and advice string
+        # Phase instructions are the only per-turn content, so they go last
+        return [
+            *self._system_messages,
+            *self._committed_messages[self._window_start:],
+            {"role": "user", "content": phase_instructions + _ANALYSIS_SUFFIX}
+        ]
+
+    def _current_turn(self, transcript: List[Dict]) -> int:
+        """Determines the current turn number from the transcript."""
+        if transcript and "turn" in transcript[-1]:
+            return transcript[-1]["turn"]
+        return len(transcript) // 2  # Approximate turn count (2 messages per turn)
+
+    def _tip_max_tokens(self, transcript: List[Dict]) -> int:
+        """
+        Output budget for a tip: tighter from the mid-late phase on, and never
+        more than what is left of the context window after the prompt.
+        """
+        cap = self.max_tip_tokens
+        if self._current_turn(transcript) > 6:
+            cap = min(cap, self.max_late_tip_tokens)
+        # Committed prefix plus a generous allowance for the phase trigger
+        remaining = self.context_tokens - self._prefix_tokens - 256
+        return max(1, min(cap, remaining))
+
+    def _should_consider_tip(self, transcript: List[Dict]) -> bool:
         """
-        prompt = f"""You are a negotiation coach providing final performance feedback.
+        Local pre-filter run before any model call.
 
-SCENARIO CONTEXT:
-User's Objectives: {self.user_objectives}
-User's BATNA: {self.user_batna}
-Success Criteria: {self.success_criteria}
+        The early phase is always analyzed since the coach is meant to be
+        generous there. After that, an exchange with no trigger words, no
+        figures and no long user message is treated as a PASS for free.
+        """
+        if self._current_turn(transcript) < self.heuristic_min_turn:
+            return True
+        for msg in transcript[self.last_analyzed_turn:]:
+            if _TIP_TRIGGER.search(msg["content"]):
+                return True
+            if msg["role"] == "user" and len(msg["content"]) > 200:
+                return True
+        return False
+
+    def _build_final_messages(self, transcript: List[Dict]) -> List[Dict[str, str]]:
+        return [
+            self._final_system_msg,
+            {"role": "user", "content": f"Here's the full negotiation:\n\n{self._compact_transcript(transcript)}"}
+        ]
+
+    def _compact_transcript(self, messages: List[Dict], budget_chars: Optional[int] = None) -> str:
+        """
+        Formats a transcript for final advice, keeping it within a size budget.
 
-Provide a structured performance review covering:
-1. What they did well (specific tactics or moves)
-2. What they could improve (missed opportunities, mistakes)
-3. How close they got to the success criteria
-4. One key lesson to take to their next negotiation
+        The most recent messages that fit in budget_chars are kept verbatim;
+        anything older is condensed into a single summary line by the cheaper
+        fallback model so prefill stops growing with negotiation length.
+        """
+        budget = self.final_budget_chars if budget_chars is None else budget_chars
 
-Keep it to 4-5 sentences. Be honest but constructive.
+        # Walk back from the end, always keeping at least the last message
+        split = len(messages)
+        used = 0
+        while split > 0:
+            used += len(messages[split - 1]["content"]) + 16  # speaker/turn label
+            if used > budget and split < len(messages):
+                break
+            split -= 1
 
-Here's the full negotiation:
+        if split == 0:
+            return self._format_transcript(messages)
 
-{self._format_transcript(transcript)}"""
+        older, recent = messages[:split], messages[split:]
+        try:
+            response = self._create_completion(
+                model=self.fallback_model,
+                messages=[
+                    {"role": "system", "content": _SUMMARY_PROMPT},
+                    {"role": "user", "content": self._format_transcript(older)}
+                ],
+                temperature=0.2,
+                max_tokens=self.max_summary_tokens,
+            )
+        except Exception as e:
+            # A longer prompt beats failing the final advice
+            logger.warning(f"Coach transcript summary failed, sending full transcript: {e}")
+            return self._format_transcript(messages)
+        summary = (response.choices[0].message.content or "").strip()
+        if not summary:
+            return self._format_transcript(messages)
+
+        if older[0].get("turn") is not None:
+            label = f"[Turns {older[0]['turn']}-{older[-1]['turn']} summarized]"
+        else:
+            label = f"[First {len(older)} messages summarized]"
+        return f"{label}: {summary}\n{self._format_transcript(recent)}"
+
+    @property
+    def _gate_enabled(self) -> bool:
+        # A cascade through the same model would only add a round-trip
+        return self.fallback_model != self.model
+
+    def _gate_messages(self, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Same prefix as the tip request, with a PASS/ACT-only trigger."""
+        return [
+            *messages[:-1],
+            {"role": "user", "content": messages[-1]["content"] + _GATE_SUFFIX}
+        ]
+
+    def _local_gate_says_pass(self, messages: List[Dict[str, str]]) -> bool:
+        """
+        Runs the optional on-device classifier over the last four messages.
 
-        response = self._create_completion(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": self.system_prompt},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=self.max_final_tokens,
+        Only confident "nothing to say" scores skip the network; anything
+        at or above the threshold falls through to the normal path.
+        """
+        if not self.local_gate_path:
+            return False
+        window = "\n".join(m["content"] for m in messages[-5:-1])
+        try:
+            score = _local_gate_probability(self.local_gate_path, window)
+        except Exception as e:
+            logger.warning(f"Local coach gate failed, disabling it: {e}")
+            self.local_gate_path = ""
+            return False
+        return score < self.local_gate_threshold
+
+    def _gate_says_pass(self, messages: List[Dict[str, str]]) -> bool:
+        """Asks the local gate, then the cheaper fallback model, whether a tip is warranted at all."""
+        if self._local_gate_says_pass(messages):
+            return True
+        if not self._gate_enabled:
+            return False
+        verdict = self._complete_text(
+            model=self.fallback_model,
+            messages=self._gate_messages(messages),
+            temperature=0.0,
+            max_tokens=self.max_gate_tokens,
         )
+        return self._filter_tip(verdict) is None
+
+    async def _agate_says_pass(self, messages: List[Dict[str, str]]) -> bool:
+        if self._local_gate_says_pass(messages):
+            return True
+        if not self._gate_enabled:
+            return False
+        verdict = await self._acomplete_text(
+            model=self.fallback_model,
+            messages=self._gate_messages(messages),
+            temperature=0.0,
+            max_tokens=self.max_gate_tokens,
+        )
+        return self._filter_tip(verdict) is None
 
-        return response.choices[0].message.content
+    def _begin_tip(self, transcript: List[Dict]) -> Optional["_TipRequest"]:
+        """
+        Shared front half of the analyze_turn variants.
+
+        Returns None when there is nothing to analyze. Otherwise claims the
+        new messages (so a re-entrant poll doesn't analyze them twice; callers
+        roll back to request.checkpoint if the model call fails) and returns
+        the request, with any semantic-cache hit in request.cached.
+        """
+        # Only analyze once both sides have spoken since the last checkpoint
+        if not self._has_new_exchange(transcript):
+            return None
+        if not self._should_consider_tip(transcript):
+            self.last_analyzed_turn = len(transcript)
+            return None
+
+        messages = self._build_analysis_messages(transcript)
+        checkpoint = self.last_analyzed_turn
+        self.last_analyzed_turn = len(transcript)
+
+        trigger = messages[-1]["content"]
+        embedding = self._embed_window(transcript)
+        return _TipRequest(
+            messages=messages,
+            trigger=trigger,
+            max_tokens=self._tip_max_tokens(transcript),
+            checkpoint=checkpoint,
+            embedding=embedding,
+            cached=self._semantic_lookup(embedding, trigger),
+        )
+
+    def _finish_tip(self, request: "_TipRequest", tip: str) -> Optional[str]:
+        """Shared back half: remembers the model's answer, returns the tip or None on PASS."""
+        self._semantic_store(request.embedding, request.trigger, tip)
+        return self._filter_tip(tip)
+
+    def _has_new_exchange(self, transcript: List[Dict]) -> bool:
+        """True if a user and a non-user message both arrived since the last analysis."""
+        new_tail = transcript[self.last_analyzed_turn:]
+        return (
+            any(m["role"] == "user" for m in new_tail)
+            and any(m["role"] != "user" for m in new_tail)
+        )
+
+    def _filter_tip(self, tip: str) -> Optional[str]:
+        """Returns None if the coach passed (check various forms), else the tip."""
+        # Only the head can hold the sentinel; endpos scans it without copying
+        if _PASS_RE.search(tip, 0, 10):
+            return None
+        return tip
 
     def reset(self) -> None:
         """Reset the coach for a new negotiation."""
         self.last_analyzed_turn = 0
+        self._reset_committed()
+        self._line_cache.clear()
+        self._reset_semantic()
+
+    def _reset_committed(self) -> None:
+        self._committed_messages = []
+        self._committed_tokens: List[int] = []  # token count per committed message
+        # Index of the first committed message sent with tip requests
+        self._window_start = 0
+        # Token count of system prompt + history window, set on each commit
+        self._prefix_tokens: Optional[int] = None
+
+    def _reset_semantic(self) -> None:
+        self._semantic_index = None
+        self._semantic_entries: List[Tuple[str, str]] = []  # (trigger, tip) per index row
+
+    def _embed_window(self, transcript: List[Dict]):
+        """Embeds the recent exchange window; None when the semantic cache is off."""
+        if not self.semantic_model:
+            return None
+        window = self._format_transcript(transcript[-self.semantic_window:])
+        embedder = _load_embedder(self.semantic_model)
+        return embedder.encode([window], normalize_embeddings=True).astype("float32")
 
-    def _create_completion(self, model: str, messages: List[Dict[str, str]], temperature: float, max_tokens: int):
-        try:
-            return self.client.chat.completions.create(
+    def _semantic_lookup(self, embedding, trigger: str) -> Optional[str]:
+        """Returns the tip of the most similar past window, if close enough."""
+        if embedding is None or self._semantic_index is None or not self._semantic_entries:
+            return None
+        scores, rows = self._semantic_index.search(embedding, 1)
+        row = int(rows[0][0])
+        if row < 0 or scores[0][0] < self.semantic_threshold:
+            return None
+        # A tip is only reusable under the same phase instructions
+        cached_trigger, tip = self._semantic_entries[row]
+        return tip if cached_trigger == trigger else None
+
+    def _semantic_store(self, embedding, trigger: str, tip: str) -> None:
+        if embedding is None:
+            return
+        if self._semantic_index is None:
+            # Inner product of L2-normalised vectors is cosine similarity
+            self._semantic_index = faiss.IndexFlatIP(embedding.shape[1])
+        self._semantic_index.add(embedding)
+        self._semantic_entries.append((trigger, tip))
+
+    def _commit_transcript(self, transcript: List[Dict]) -> None:
+        """
+        Appends transcript messages not yet seen to the committed history.
+
+        Earlier entries are never rewritten, and the window start only snaps
+        forward (see _snap_window), so the request prefix stays byte-identical
+        between snaps. Timestamps are left out on purpose.
+        """
+        if len(transcript) < len(self._committed_messages):
+            # A different (shorter) transcript means a new negotiation
+            self._reset_committed()
+
+        # Only messages past the committed tail are formatted and counted
+        for msg in transcript[len(self._committed_messages):]:
+            content = self._format_transcript([msg])
+            self._committed_messages.append({
+                "role": "user" if msg["role"] == "user" else "assistant",
+                "content": content,
+            })
+            self._committed_tokens.append(count_tokens(content))
+
+        self._snap_window()
+        self._prefix_tokens = self._system_tokens + sum(self._committed_tokens[self._window_start:])
+
+    def _snap_window(self) -> None:
+        """Moves the window start forward once the history outgrows its limits."""
+        n = self.history_messages
+        count = len(self._committed_messages)
+        start = max(0, (count - n) // n * n) if n > 0 else 0
+        start = max(start, self._window_start)
+        if self.history_tokens > 0:
+            window = sum(self._committed_tokens[start:])
+            # Keep at least the latest exchange
+            while window > self.history_tokens and start + 2 < count:
+                window -= self._committed_tokens[start] + self._committed_tokens[start + 1]
+                start += 2
+        self._window_start = start
+
+    def _complete_text(self, model: str, messages: List[Dict[str, str]], temperature: float, max_tokens: int) -> str:
+        """Runs a non-streaming completion and returns the stripped reply text."""
+        if not self.raw_http:
+            response = self._create_completion(
                 model=model,
                 messages=messages,
                 temperature=temperature,
                 max_tokens=max_tokens,
             )
-        except Exception as e:
-            error_text = str(e).lower()
-            if "rate_limit" in error_text or "429" in error_text:
-                return self.client.chat.completions.create(
-                    model=self.fallback_model,
-                    messages=messages,
-                    temperature=temperature,
-                    max_tokens=max_tokens,
-                )
-            raise
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                logger.debug(f"Coach completion used {usage.completion_tokens}/{max_tokens} tokens ({model})")
+            return (response.choices[0].message.content or "").strip()
+
+        return raw_completion_text(
+            model, messages, temperature, max_tokens, fallback_model=self.fallback_model
+        ).strip()
+
+    async def _acomplete_text(self, model: str, messages: List[Dict[str, str]], temperature: float, max_tokens: int) -> str:
+        if not self.raw_http:
+            response = await self._acreate_completion(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+            )
+            return (response.choices[0].message.content or "").strip()
+
+        reply = await araw_completion_text(
+            model, messages, temperature, max_tokens, fallback_model=self.fallback_model
+        )
+        return reply.strip()
+
+    def _create_completion(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        stream: bool = False,
+    ):
+        return create_completion(
+            self.client,
+            self.fallback_model,
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=stream,
+        )
+
+    async def _acreate_completion(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        stream: bool = False,
+    ):
+        return await acreate_completion(
+            self.aclient,
+            self.fallback_model,
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=stream,
+        )
 
     def _format_transcript(self, messages: List[Dict]) -> str:
         """
@@ -254,16 +905,60 @@ Here's the full negotiation:
         Handles both simple format (role, content) and full format
         (role, content, timestamp, turn) from NegotiationSession.
         """
-        formatted = []
-        for msg in messages:
-            role = "User" if msg["role"] == "user" else "Opponent"
-            content = msg.get("content", "")
-
-            # Include turn number if available
-            turn = msg.get("turn")
-            if turn is not None:
-                formatted.append(f"[Turn {turn}] {role}: {content}")
-            else:
-                formatted.append(f"{role}: {content}")
-
-        return "\n".join(formatted)
+        if not messages:
+            return ""
+
+        # A transcript is either all full format or all simple format, so
+        # check once for turn numbers instead of per message
+        with_turn = messages[0].get("turn") is not None
+        return "\n".join(self._format_line(m, with_turn) for m in messages)
+
+    def _format_line(self, msg: Dict, with_turn: bool) -> str:
+        """
+        Formats a single transcript message, memoized per message object.
+
+        Transcript entries are append-only, so each one only needs to be
+        formatted once no matter how many windows it later appears in.
+        """
+        cached = self._line_cache.get(id(msg))
+        # The cached entry keeps msg alive, so a matching id is the same dict
+        if cached is not None and cached[0] is msg and cached[1] == with_turn:
+            return cached[2]
+
+        speaker = _ROLE_MAP.get(msg["role"], "Opponent")
+        if with_turn:
+            line = f"[Turn {msg['turn']}] {speaker}: {msg['content']}"
+        else:
+            line = f"{speaker}: {msg['content']}"
+        self._line_cache[id(msg)] = (msg, with_turn, line)
+        return line
+
+
+async def batch_final_advice(
+    sessions: List[Tuple[CoachAgent, List[Dict]]],
+    concurrency: Optional[int] = None,
+) -> List[object]:
+    """
+    Generates final advice for many finished sessions concurrently.
+
+    Args:
+        sessions: (coach, transcript) pairs
+        concurrency: Max requests in flight; size this to the Groq rate-limit
+            tier. Defaults to GROQ_COACH_FINAL_CONCURRENCY.
+
+    Returns:
+        Advice strings in input order; a failed session yields its exception
+        instead of aborting the batch.
+    """
+    if concurrency is None:
+        concurrency = int(os.getenv("GROQ_COACH_FINAL_CONCURRENCY", "8"))
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def advise(coach: CoachAgent, transcript: List[Dict]) -> str:
+        async with semaphore:
+            return await coach.get_final_advice_async(transcript)
+
+    return await asyncio.gather(
+        *(advise(coach, transcript) for coach, transcript in sessions),
+        return_exceptions=True,
+    )
@@ -1,124 +1,79 @@
 import os
+import json
+import asyncio
+import time
+import difflib
+import hashlib
+import random
+import logging
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Dict
-from groq import Groq
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import AsyncIterator, Iterator, List, Dict, Optional, Sequence, Tuple
 
+from agents._groq_client import (
+    acreate_completion,
+    araw_completion_text,
+    count_tokens,
+    create_completion,
+    get_async_client,
+    get_client,
+    raw_completion_text,
+    resolve_model,
+    serialize_message,
+)
 
-class OpponentAgent:
-    """
-    AI opponent that role-plays the counterparty in a negotiation.
-
-    This agent generates responses based on scenario context and maintains
-    its own transcript for context.
-
-    Usage:
-        opponent = OpponentAgent(opponent_config)
-
-        # Get opening message
-        opening = opponent.get_opening_message()
-
-        # During negotiation
-        response = opponent.get_response(user_message)
-    """
-
-    transcript: List[Dict[str, str]]
-    revealed_info: List[str]
-    context: str
-    name: str
-    objectives: str
-    interests: str
-    batna: str
-    constraints: List[str] | str
-    info_asymmetries: str
-    disposition: str
-    personality: str
-    role_description: str
-    negotiables: List[str]
-
-    def __init__(self, scenario_data: Dict):
-        """
-        Args:
-            scenario_data: Configuration dict containing:
-                - context: Background context
-                - counterparty_name: Name/role of the opponent
-                - counterparty_objectives: Their goals
-                - counterparty_interests: WHY they care (deeper motivations)
-                - batna: Their walkaway alternative
-                - constraints: Deadlines, budgets, external pressures
-                - information_asymmetries: What they know that user doesn't
-                - disposition: Their likely tactics and behavior
-                - personality: Communication style (friendly, aggressive, etc.)
-                - shared_context: The shared scenario context both parties know
-                - scenario_title: Title of the negotiation scenario
-        """
-        self.client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-        self.model = os.getenv("GROQ_OPPONENT_MODEL", "llama-3.3-70b-versatile")
-        self.fallback_model = os.getenv("GROQ_OPPONENT_FALLBACK_MODEL", "llama-3.3-70b-versatile")
-        self.max_history_messages = int(os.getenv("GROQ_OPPONENT_HISTORY", "0"))
-        self.max_opening_tokens = int(os.getenv("GROQ_OPPONENT_OPENING_TOKENS", "100"))
-        self.max_response_tokens = int(os.getenv("GROQ_OPPONENT_RESPONSE_TOKENS", "150"))
-
-        # Extract scenario details
-        self.context = scenario_data.get("context", "")
-        self.name = scenario_data.get("counterparty_name", "Counterparty")
-        self.objectives = scenario_data.get("counterparty_objectives", "")
-        self.interests = scenario_data.get("counterparty_interests", "")
-        self.batna = scenario_data.get("batna", "")
-        self.constraints = scenario_data.get("constraints", [])
-        self.info_asymmetries = scenario_data.get("information_asymmetries", "")
-        self.disposition = scenario_data.get("disposition", "")
-        self.personality = scenario_data.get("personality", "neutral")
-        self.role_description = scenario_data.get("role_description", "")
-        self.negotiables = scenario_data.get("negotiables", [])
+try:
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    np = None
+    SentenceTransformer = None
 
-        # Additional scenario context for answering questions
-        self.shared_context = scenario_data.get("shared_context", {})
-        self.scenario_title = scenario_data.get("scenario_title", "")
-        self.opening_position = scenario_data.get("opening_position", "")
-        self.success_criteria = scenario_data.get("success_criteria", {})
+logger = logging.getLogger(__name__)
 
-        # Initialize transcript
-        self.transcript = []
-        self.revealed_info = []
-        self.current_turn = 0
-        self.user_price_anchor = None
+# Folds messages that slid out of the history window into the running summary
+_SUMMARY_PROMPT = """You maintain a running summary of a negotiation you are part of. Merge the earlier summary (if any) with the new messages into 2-4 sentences. Keep every number, offer, concession, deadline and stated priority. Plain text only."""
 
-        # Build system prompt
-        self.system_prompt = self._build_system_prompt()
 
-    def _build_system_prompt(self) -> str:
-        """Creates rich system prompt using full scenario context."""
-        constraints_str = ", ".join(self.constraints) if isinstance(self.constraints, list) else self.constraints
-        negotiables_str = ", ".join(self.negotiables) if self.negotiables else "Not specified"
-
-        # Build shared context string if available
-        shared_context_str = ""
-        if self.shared_context:
-            situation = self.shared_context.get("situation", "")
-            relationship = self.shared_context.get("relationship_history", "")
-            setting = self.shared_context.get("setting", "")
-            stakes = self.shared_context.get("stakes", "")
-            shared_context_str = f"""
-=== SCENARIO BACKGROUND (WHAT BOTH PARTIES KNOW) ===
-Situation: {situation}
-Relationship History: {relationship}
-Setting: {setting}
-Stakes: {stakes}
-"""
+# Per-phase guidance appended to the opponent's system prompt. Only the
+# current phase is sent, and it goes last so everything before it stays a
+# stable, cacheable prefix when the phase changes.
+_PHASE_GUIDANCE = {
+    "opening": """OPENING (first few exchanges):
+- Keep it brief. A quick hello and get to business.
+- State your initial position simply—no long preambles.
+- Ask what they're looking for. One question, not three.""",
+    "exploration": """EXPLORATION (middle phase):
+- Ask questions to understand what they actually need.
+- React genuinely—push back, show interest, express concern.
+- Float ideas casually: "What if..." or "Have you thought about...\"""",
+    "bargaining": """BARGAINING (when positions are clear):
+- Make concrete offers. Be specific with numbers.
+- Trade fairly—give something, get something.
+- If stuck, try a different angle.""",
+    "closing": """CLOSING (only when truly aligned):
+- Confirm the deal simply: "So we're at X and Y—we good?"
+- If they hesitate, address it. Don't push.""",
+}
+# Blocks sent in each phase. Agreement can't be read off the turn count,
+# so closing guidance rides along with bargaining.
+_PHASE_BLOCKS = {
+    "opening": ("opening",),
+    "exploration": ("exploration",),
+    "bargaining": ("bargaining", "closing"),
+    "all": ("opening", "exploration", "bargaining", "closing"),
+}
 
-        # Build success criteria string if available
-        success_str = ""
-        if self.success_criteria:
-            good = self.success_criteria.get("good_outcome", "")
-            great = self.success_criteria.get("great_outcome", "")
-            if good or great:
-                success_str = f"""
-=== YOUR SUCCESS CRITERIA ===
-Good outcome for you: {good}
-Great outcome for you: {great}
-"""
 
-        return f"""You are {self.name} in a realistic negotiation. You are a human with real pressures, motivations, and limits.
+# The opponent's system prompt is a per-scenario header followed by rules
+# that are the same for every scenario
+_PROMPT_HEADER = """You are {name} in a realistic negotiation. You are a human with real pressures, motivations, and limits.
 
 YOU KNOW EVERYTHING ABOUT THIS SCENARIO. When asked about the negotiation, your role, the situation, numbers, terms, or any details—answer confidently and specifically using the information below. You are fully informed about your position, the context, and what's being negotiated.
 
@@ -134,57 +89,38 @@ CRITICAL RULES:
 9. Do NOT invent numbers or terms. Only use numbers given in this prompt or stated by the user. If no numbers have been stated, ask once for a range, then move on without repeating.
 
 === YOUR SITUATION ===
-{self.context}
+{context}
 
 === YOUR ROLE ===
-{self.role_description}
+{role_description}
 
 === YOUR GOALS ===
-{self.objectives}
+{objectives}
 
 === WHY THIS MATTERS TO YOU ===
-{self.interests}
+{interests}
 
 === YOUR WALKAWAY (BATNA) ===
-{self.batna}
+{batna}
 
 === YOUR CONSTRAINTS ===
-{constraints_str}
+{constraints}
 
 === WHAT'S ON THE TABLE ===
-{negotiables_str}
+{negotiables}
 
 === PRIVATE INFORMATION (protect this) ===
-{self.info_asymmetries}
+{info_asymmetries}
 
 === YOUR PERSONALITY ===
-{self.personality}
+{personality}
 
 === YOUR TACTICAL APPROACH ===
-{self.disposition}
-{success_str}
-=== NEGOTIATION PHASES ===
-
-OPENING (first few exchanges):
-- Keep it brief. A quick hello and get to business.
-- State your initial position simply—no long preambles.
-- Ask what they're looking for. One question, not three.
-
-EXPLORATION (middle phase):
-- Ask questions to understand what they actually need.
-- React genuinely—push back, show interest, express concern.
-- Float ideas casually: "What if..." or "Have you thought about..."
-
-BARGAINING (when positions are clear):
-- Make concrete offers. Be specific with numbers.
-- Trade fairly—give something, get something.
-- If stuck, try a different angle.
-
-CLOSING (only when truly aligned):
-- Confirm the deal simply: "So we're at X and Y—we good?"
-- If they hesitate, address it. Don't push.
+{disposition}
+{success}
+"""
 
-=== HOW TO RESPOND ===
+_STATIC_TAIL = """=== HOW TO RESPOND ===
 - Don't accept right away, even if it's good. Probe a bit.
 - React like a real person—surprised, skeptical, interested.
 - Counter with a reason: "Can't do that because... but I could do..."
@@ -258,6 +194,487 @@ Remember: Walking away is a last resort. Most negotiations should reach a deal o
 - If asked about something you don't know, just say you don't know or would need to check
 - Just talk like a normal person having a real conversation"""
 
+
+@lru_cache(maxsize=256)
+def _render_system_prompt(
+    name: str,
+    context: str,
+    role_description: str,
+    objectives: str,
+    interests: str,
+    batna: str,
+    constraints: str,
+    negotiables: str,
+    info_asymmetries: str,
+    personality: str,
+    disposition: str,
+    good_outcome: str,
+    great_outcome: str,
+) -> str:
+    """
+    The opponent's system prompt minus phase guidance.
+
+    Memoized on the scenario fields so sessions of the same scenario skip
+    the render and share one prompt string.
+    """
+    success_str = ""
+    if good_outcome or great_outcome:
+        success_str = f"""
+=== YOUR SUCCESS CRITERIA ===
+Good outcome for you: {good_outcome}
+Great outcome for you: {great_outcome}
+"""
+
+    return _PROMPT_HEADER.format(
+        name=name,
+        context=context,
+        role_description=role_description,
+        objectives=objectives,
+        interests=interests,
+        batna=batna,
+        constraints=constraints,
+        negotiables=negotiables,
+        info_asymmetries=info_asymmetries,
+        personality=personality,
+        disposition=disposition,
+        success=success_str,
+    ) + _STATIC_TAIL
+
+
+@lru_cache(maxsize=None)
+def _load_embedder(name: str):
+    """Loads a sentence-transformers model once per process."""
+    return SentenceTransformer(name)
+
+
+# Groq has no explicit cache_control; it reuses matching prompt prefixes on
+# its own, so the prompt is only tokenized locally for budgeting
+_prompt_tokens = lru_cache(maxsize=256)(count_tokens)
+
+
+@lru_cache(maxsize=256)
+def _render_phase_prompt(base: str, phase: str) -> str:
+    guidance = "\n\n".join(_PHASE_GUIDANCE[name] for name in _PHASE_BLOCKS[phase])
+    return f"{base}\n\n=== NEGOTIATION PHASE ===\n\n{guidance}"
+
+
+# Speech-to-text often yields bare fillers; these get a canned continuer
+# instead of a model call. Words like "okay" or "sure" are left out since
+# they can accept an offer.
+_FILLER_UTTERANCES = frozenset({"", "uh", "um", "umm", "er", "ah", "hm", "hmm", "mm", "mhm", "mm-hm", "uh-huh"})
+_CONTINUERS = ("Go on.", "And?", "I'm listening.", "Go ahead.")
+
+
+# Most first user turns are a greeting, so the reply to this one is
+# generated while the opening line is being spoken
+_SPECULATIVE_GREETING = "Hi, thanks for meeting."
+
+
+@lru_cache(maxsize=None)
+def _speculation_pool() -> ThreadPoolExecutor:
+    """Background pool for speculation, drafts and prewarms, created on first use."""
+    return ThreadPoolExecutor(
+        max_workers=int(os.getenv("GROQ_OPPONENT_SPECULATE_WORKERS", "4")),
+        thread_name_prefix="opp-speculate",
+    )
+
+
+# Replies to byte-identical early exchanges, shared by every opponent in the
+# process (the system prompt is part of the key), most recent last
+_RESPONSE_CACHE: "OrderedDict[bytes, str]" = OrderedDict()
+_RESPONSE_CACHE_LOCK = threading.Lock()
+RESPONSE_CACHE_SIZE = int(os.getenv("GROQ_OPPONENT_CACHE_SIZE", "512"))
+# Only short conversations repeat often enough to be worth caching
+RESPONSE_CACHE_MAX_MESSAGES = int(os.getenv("GROQ_OPPONENT_CACHE_MAX_MESSAGES", "8"))
+
+
+# Replies being generated right now, by the same key; concurrent identical
+# requests (eval batches of one scenario) await one call instead of each
+# sending their own
+_IN_FLIGHT: Dict[bytes, "asyncio.Task[str]"] = {}
+
+
+def _cached_response(key: Optional[bytes]) -> Optional[str]:
+    if key is None:
+        return None
+    with _RESPONSE_CACHE_LOCK:
+        reply = _RESPONSE_CACHE.get(key)
+        if reply is not None:
+            _RESPONSE_CACHE.move_to_end(key)
+        return reply
+
+
+def _store_response(key: Optional[bytes], reply: str) -> None:
+    if key is None or not reply:
+        return
+    with _RESPONSE_CACHE_LOCK:
+        _RESPONSE_CACHE[key] = reply
+        if len(_RESPONSE_CACHE) > RESPONSE_CACHE_SIZE:
+            _RESPONSE_CACHE.popitem(last=False)
+
+
+def _remove_spill(path: str) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+# Context windows of models the opponent is commonly pointed at; anything
+# else uses GROQ_OPPONENT_CONTEXT_TOKENS, or 131072 when that is unset
+_MODEL_CONTEXT = {
+    "llama-3.1-8b-instant": 131072,
+    "llama-3.3-70b-versatile": 131072,
+    "llama-3.3-70b-specdec": 8192,
+    "gemma2-9b-it": 8192,
+}
+
+
+def _load_config() -> SimpleNamespace:
+    """Reads the opponent's env settings; done once, at import."""
+    summary_model = os.getenv("GROQ_OPPONENT_SUMMARY_MODEL", "instant")
+    draft_model = os.getenv("GROQ_OPPONENT_DRAFT_MODEL", "")
+    retrieval_model = os.getenv("GROQ_OPPONENT_RETRIEVAL_MODEL", "")
+    if retrieval_model and SentenceTransformer is None:
+        logger.warning("GROQ_OPPONENT_RETRIEVAL_MODEL is set but sentence-transformers/numpy are not installed; retrieval disabled.")
+        retrieval_model = ""
+    # Short spoken replies are latency-bound, so default to the instant
+    # tier; GROQ_OPPONENT_MODEL still pins an exact model
+    model = os.getenv("GROQ_OPPONENT_MODEL") or resolve_model(os.getenv("GROQ_OP_MODEL", "instant"))
+    return SimpleNamespace(
+        model=model,
+        fallback_model=os.getenv("GROQ_OPPONENT_FALLBACK_MODEL", "llama-3.3-70b-versatile"),
+        # Recent messages sent verbatim; older ones are folded into a rolling
+        # summary every max_history_messages messages (0 = send everything)
+        max_history_messages=int(os.getenv("GROQ_OPPONENT_HISTORY", "12")),
+        # Set to "none" to drop old messages without summarizing them
+        summary_model="" if summary_model.lower() == "none" else resolve_model(summary_model),
+        max_summary_tokens=int(os.getenv("GROQ_OPPONENT_SUMMARY_TOKENS", "150")),
+        # Input-token budget per reply request (0 = off). When system prompt,
+        # summary and verbatim window would exceed it, the window snaps
+        # forward early, whole exchanges at a time.
+        max_prompt_tokens=int(os.getenv("GROQ_OPPONENT_PROMPT_TOKENS", "0")),
+        # The window also snaps before the request would pass 90% of the
+        # model's context (less the reply), whatever the budget above
+        context_tokens=int(os.getenv("GROQ_OPPONENT_CONTEXT_TOKENS", "0")) or _MODEL_CONTEXT.get(model, 131072),
+        max_opening_tokens=int(os.getenv("GROQ_OPPONENT_OPENING_TOKENS", "100")),
+        max_response_tokens=int(os.getenv("GROQ_OPPONENT_RESPONSE_TOKENS", "150")),
+        # Sampling for openings and replies. Lower temperature plus a fixed
+        # seed gives reproducible runs (CI, evals) that can hit response caches.
+        temperature=float(os.getenv("GROQ_OPPONENT_TEMPERATURE", "0.8")),
+        top_p=float(os.getenv("GROQ_OPPONENT_TOP_P", "1.0")),
+        seed=int(os.getenv("GROQ_OPPONENT_SEED", "0")) or None,
+        # Earlier messages already folded into the summary can be recalled
+        # verbatim when relevant: the top-K by embedding similarity to the
+        # latest user message are attached as a note after the history
+        retrieval_model=retrieval_model,
+        retrieval_k=int(os.getenv("GROQ_OPPONENT_RETRIEVAL_K", "4")),
+        # Batch simulations that never export the transcript can skip the
+        # per-entry clock read; the post-mortem treats missing timestamps as unknown
+        log_timestamps=os.getenv("GROQ_OPPONENT_LOG_TIMESTAMPS", "1") == "1",
+        # Live transcript entries kept in memory before older ones spill to
+        # disk (0 = keep everything); see full_transcript()
+        hot_transcript_limit=int(os.getenv("GROQ_OPPONENT_HOT_TRANSCRIPT", "0")),
+        # Non-streaming calls (get_response, get_response_async, speculation
+        # and drafts) can skip the SDK and post JSON directly; the system
+        # message is then encoded once per phase instead of every turn
+        raw_http=os.getenv("GROQ_OPPONENT_RAW_HTTP", "0") == "1",
+        # Hash of the system prompt sent as an x-cache-hint header so servers
+        # with prompt-handle caching can key on it. Off by default: Groq
+        # ignores it, so it would only leak a digest of the hidden prompt
+        cache_hint=os.getenv("GROQ_OPPONENT_CACHE_HINT", "0") == "1",
+        # Only the current phase's guidance is sent (0 sends every phase);
+        # phases advance by user turn, or straight to bargaining once a
+        # price is on the table
+        phased_prompt=os.getenv("GROQ_OPPONENT_PHASED_PROMPT", "1") == "1",
+        exploration_turn=int(os.getenv("GROQ_OPPONENT_EXPLORATION_TURN", "2")),
+        bargaining_turn=int(os.getenv("GROQ_OPPONENT_BARGAINING_TURN", "5")),
+        # Send a 1-token request on construction to open the connection.
+        # Off by default: it is a billable request per agent
+        warmup=os.getenv("GROQ_OPPONENT_WARMUP", "0") == "1",
+        # After each model reply, re-send the conversation so far with max_tokens=1
+        # while TTS plays it, so the provider's prompt cache already holds
+        # that prefix when the user answers. Costs one tiny request per turn.
+        prewarm_next=os.getenv("GROQ_OPPONENT_PREWARM", "0") == "1",
+        filler_replies=os.getenv("GROQ_OPPONENT_FILLER_REPLIES", "1") == "1",
+        # Prefetch the reply to a generic greeting right after the opening;
+        # used when the first user turn is close enough to it (difflib ratio)
+        speculate_first_reply=os.getenv("GROQ_OPPONENT_SPECULATE", "0") == "1",
+        speculate_threshold=float(os.getenv("GROQ_OPPONENT_SPECULATE_THRESHOLD", "0.85")),
+        # Turn-level draft: a smaller model writes the reply while the main
+        # model produces only its first few tokens; the draft is kept when it
+        # starts the same way. Off when unset or equal to the main model.
+        # Drafting stops for the session once fewer than half are accepted.
+        draft_model=resolve_model(draft_model) if draft_model else "",
+        draft_check_tokens=int(os.getenv("GROQ_OPPONENT_DRAFT_CHECK_TOKENS", "8")),
+    )
+
+
+_CONFIG = _load_config()
+
+# Canned text returned by offline agents
+_OFFLINE_REPLY = "Let me think about that."
+
+
+class _OfflineStream:
+    """Stands in for a streamed completion in offline mode."""
+
+    def __init__(self):
+        self._chunks = [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=_OFFLINE_REPLY))])]
+
+    def __iter__(self):
+        return iter(self._chunks)
+
+    async def __aiter__(self):
+        for chunk in self._chunks:
+            yield chunk
+
+    def close(self) -> None:
+        pass
+
+
+class _AsyncOfflineStream(_OfflineStream):
+    async def close(self) -> None:
+        pass
+
+
+def _offline_response(stream: bool, aio: bool = False):
+    if stream:
+        return _AsyncOfflineStream() if aio else _OfflineStream()
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=_OFFLINE_REPLY))])
+
+
+class OpponentAgent:
+    """
+    AI opponent that role-plays the counterparty in a negotiation.
+
+    This agent generates responses based on scenario context and maintains
+    its own transcript for context.
+
+    Usage:
+        opponent = OpponentAgent(opponent_config)
+
+        # Get opening message
+        opening = opponent.get_opening_message()
+
+        # During negotiation
+        response = opponent.get_response(user_message)
+
+        # From async code, without blocking the event loop
+        response = await opponent.get_response_async(user_message)
+    """
+
+    # Many agents run side by side in evals, so instances carry no __dict__
+    __slots__ = (
+        # Clients and model settings
+        "client", "aclient", "model", "fallback_model", "temperature", "top_p", "seed", "_sampling",
+        "raw_http", "cache_hint", "_cache_headers",
+        # Scenario
+        "context", "name", "objectives", "interests", "batna", "constraints", "constraints_str",
+        "info_asymmetries", "disposition", "personality", "role_description", "negotiables",
+        "shared_context", "scenario_title", "opening_position", "success_criteria",
+        # Transcript and its LLM-facing views
+        "transcript", "current_turn", "user_price_anchor", "log_timestamps", "hot_transcript_limit",
+        "_spill_path", "_spill_finalizer", "_spilled", "_spilled_count", "_stamped",
+        "_llm_messages", "_llm_tokens",
+        # History window, summary and budgets
+        "max_history_messages", "summary_model", "max_summary_tokens", "max_prompt_tokens",
+        "context_tokens", "max_opening_tokens", "max_response_tokens", "history_summary", "_summary_cut",
+        "retrieval_model", "retrieval_k", "_embeddings",
+        # System prompt and phases
+        "system_prompt", "_system_msg", "_prompt_digest", "_system_blob", "_system_tokens",
+        "_prompt_base", "_phase_prompts", "phase", "phased_prompt", "exploration_turn", "bargaining_turn",
+        # Latency features
+        "prewarm_next", "_prewarm_task", "filler_replies", "speculate_first_reply", "speculate_threshold",
+        "_speculation", "draft_model", "draft_check_tokens", "_draft_accepted", "_draft_tried",
+        # weakref.finalize deletes the spill file when the agent goes away
+        "__weakref__",
+    )
+
+    # Tests and dry runs: replies are canned and no Groq client is built
+    offline_mode: bool = os.getenv("GROQ_OPPONENT_OFFLINE", "0") == "1"
+
+    transcript: List[Dict[str, str]]
+    context: str
+    name: str
+    objectives: str
+    interests: str
+    batna: str
+    constraints: List[str] | str
+    constraints_str: str
+    info_asymmetries: str
+    disposition: str
+    personality: str
+    role_description: str
+    negotiables: List[str]
+
+    def __init__(self, scenario_data: Dict):
+        """
+        Args:
+            scenario_data: Configuration dict containing:
+                - context: Background context
+                - counterparty_name: Name/role of the opponent
+                - counterparty_objectives: Their goals
+                - counterparty_interests: WHY they care (deeper motivations)
+                - batna: Their walkaway alternative
+                - constraints: Deadlines, budgets, external pressures
+                - information_asymmetries: What they know that user doesn't
+                - disposition: Their likely tactics and behavior
+                - personality: Communication style (friendly, aggressive, etc.)
+                - shared_context: The shared scenario context both parties know
+                - scenario_title: Title of the negotiation scenario
+        """
+        cfg = _CONFIG
+        # Offline agents never build or touch a client
+        self.client = None if self.offline_mode else get_client()
+        self.aclient = None if self.offline_mode else get_async_client()
+        self.model = cfg.model
+        self.fallback_model = cfg.fallback_model
+        self.max_history_messages = cfg.max_history_messages
+        self.summary_model = cfg.summary_model
+        self.max_summary_tokens = cfg.max_summary_tokens
+        self.max_prompt_tokens = cfg.max_prompt_tokens
+        self.context_tokens = cfg.context_tokens
+        self.max_opening_tokens = cfg.max_opening_tokens
+        self.max_response_tokens = cfg.max_response_tokens
+        self.temperature = cfg.temperature
+        self.top_p = cfg.top_p
+        self.seed = cfg.seed
+        self._sampling = {}
+        if self.top_p < 1.0:
+            self._sampling["top_p"] = self.top_p
+        if self.seed is not None:
+            self._sampling["seed"] = self.seed
+
+        # Extract scenario details
+        self.context = scenario_data.get("context", "")
+        self.name = scenario_data.get("counterparty_name", "Counterparty")
+        self.objectives = scenario_data.get("counterparty_objectives", "")
+        self.interests = scenario_data.get("counterparty_interests", "")
+        self.batna = scenario_data.get("batna", "")
+        self.constraints = scenario_data.get("constraints", [])
+        # Scenarios give constraints as either a list or a sentence
+        self.constraints_str = ", ".join(self.constraints) if isinstance(self.constraints, list) else (self.constraints or "")
+        self.info_asymmetries = scenario_data.get("information_asymmetries", "")
+        self.disposition = scenario_data.get("disposition", "")
+        self.personality = scenario_data.get("personality", "neutral")
+        self.role_description = scenario_data.get("role_description", "")
+        self.negotiables = scenario_data.get("negotiables", [])
+
+        # Additional scenario context for answering questions
+        self.shared_context = scenario_data.get("shared_context", {})
+        self.scenario_title = scenario_data.get("scenario_title", "")
+        self.opening_position = scenario_data.get("opening_position", "")
+        self.success_criteria = scenario_data.get("success_criteria", {})
+
+        # Initialize transcript
+        self.transcript = []
+        self.current_turn = 0
+        self.user_price_anchor = None
+        self.history_summary = ""
+        self._llm_messages: List[Dict[str, str]] = []
+        self._llm_tokens: List[int] = []  # token count per _llm_messages entry, filled lazily
+        self.retrieval_model = cfg.retrieval_model
+        self.retrieval_k = cfg.retrieval_k
+        self._embeddings = None  # one normalized row per summarized transcript entry
+        self.log_timestamps = cfg.log_timestamps
+        self.hot_transcript_limit = cfg.hot_transcript_limit
+        self._spill_path: Optional[str] = None
+        self._spill_finalizer: Optional[weakref.finalize] = None
+        self._spilled: Optional[List[Dict]] = None  # parsed spill file, read on first export
+        self._spilled_count = 0
+        self._stamped = 0  # transcript entries whose ISO timestamp is filled in
+        self._summary_cut = 0  # transcript index where the verbatim window starts
+
+        self.raw_http = cfg.raw_http and not self.offline_mode
+        self.cache_hint = cfg.cache_hint
+        self._cache_headers: Optional[Dict[str, str]] = None
+
+        # Build system prompt; phase guidance is appended per phase
+        self.phased_prompt = cfg.phased_prompt
+        self.exploration_turn = cfg.exploration_turn
+        self.bargaining_turn = cfg.bargaining_turn
+        self._prompt_base = self._build_system_prompt()
+        # (prompt, message, digest, raw blob) per phase, rendered on first use
+        self._phase_prompts: Dict[str, Tuple[str, Dict[str, str], bytes, bytes]] = {}
+        self.phase = ""
+        self._set_phase(self._current_phase())
+
+        self.prewarm_next = cfg.prewarm_next and not self.offline_mode
+        self._prewarm_task: Optional[asyncio.Task] = None
+        self.filler_replies = cfg.filler_replies
+        self.speculate_first_reply = cfg.speculate_first_reply
+        self.speculate_threshold = cfg.speculate_threshold
+        # (pending reply, transcript length, system message) it was built for
+        self._speculation: Optional[Tuple[object, int, Dict[str, str]]] = None
+        self.draft_model = cfg.draft_model
+        self.draft_check_tokens = cfg.draft_check_tokens
+        self._draft_accepted = 0
+        self._draft_tried = 0
+
+        # Open the connection and prime the provider's prompt cache while
+        # the user is still getting ready, not on the opening line
+        if cfg.warmup and not self.offline_mode:
+            threading.Thread(target=self.warmup, daemon=True).start()
+
+    def warmup(self) -> None:
+        """Fires a 1-token request with the static system prompt; failures are ignored."""
+        try:
+            # Through _create_completion so it counts against the in-flight cap
+            self._create_completion(
+                model=self.model,
+                messages=[self._system_msg, {"role": "user", "content": "."}],
+                temperature=0,
+                max_tokens=1,
+                # Fixed so identical warmups across restarts can hit the provider cache
+                seed=1,
+            )
+        except Exception as e:
+            logger.debug(f"Opponent warmup failed: {e}")
+
+    def _schedule_prewarm(self) -> None:
+        """Primes the cache for the next turn's prefix in the background."""
+        messages = self._request_head()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            _speculation_pool().submit(self._prewarm, messages)
+            return
+        # Keep a reference so the task isn't collected mid-flight
+        self._prewarm_task = loop.create_task(self._aprewarm(messages))
+
+    def _prewarm(self, messages: List[Dict[str, str]]) -> None:
+        try:
+            self._create_completion(model=self.model, messages=messages, temperature=0, max_tokens=1, seed=1)
+        except Exception as e:
+            logger.debug(f"Opponent prewarm failed: {e}")
+
+    async def _aprewarm(self, messages: List[Dict[str, str]]) -> None:
+        try:
+            await self._acreate_completion(model=self.model, messages=messages, temperature=0, max_tokens=1, seed=1)
+        except Exception as e:
+            logger.debug(f"Opponent prewarm failed: {e}")
+
+    def _build_system_prompt(self) -> str:
+        """Creates rich system prompt using full scenario context."""
+        success = self.success_criteria or {}
+        # str() matches what the f-string would render and keeps the key hashable
+        return _render_system_prompt(*(str(value) for value in (
+            self.name,
+            self.context,
+            self.role_description,
+            self.objectives,
+            self.interests,
+            self.batna,
+            self.constraints_str,
+            ", ".join(self.negotiables) if self.negotiables else "Not specified",
+            self.info_asymmetries,
+            self.personality,
+            self.disposition,
+            success.get("good_outcome", ""),
+            success.get("great_outcome", ""),
+        )))
+
     def get_opening_message(self) -> str:
         """
         Generate the opponent's opening line to start the negotiation.
@@ -265,27 +682,67 @@ Remember: Walking away is a last resort. Most negotiations should reach a deal o
         Returns:
             The opening message text
         """
-        opening_prompt = """The meeting is starting. Say a brief, natural greeting—just a sentence or two like a real person would. Don't over-explain or set up the whole negotiation. Keep it casual and short. No filler words, no stage directions."""
+        reply = self._complete_text(self._build_opening_messages(), self.max_opening_tokens)
+        reply = self._record_reply(reply, turn=0)
+        self._start_speculation()
+        return reply
+
+    async def get_opening_message_async(self) -> str:
+        """Async variant of get_opening_message."""
+        reply = await self._acomplete_text(self._build_opening_messages(), self.max_opening_tokens)
+        reply = self._record_reply(reply, turn=0)
+        self._start_speculation(in_loop=True)
+        return reply
+
+    def get_opening_message_stream(self) -> Iterator[str]:
+        """
+        Streaming variant of get_opening_message.
 
-        response = self._create_completion(
+        Yields the opening line as tokens arrive so TTS can start on the
+        first sentence. The line is added to the transcript once the stream
+        ends, including when the consumer stops early.
+        """
+        stream = self._create_completion(
             model=self.model,
-            messages=[
-                {"role": "system", "content": self.system_prompt},
-                {"role": "user", "content": opening_prompt}
-            ],
-            temperature=0.8,
+            messages=self._build_opening_messages(),
+            temperature=self.temperature,
+            **self._sampling,
             max_tokens=self.max_opening_tokens,
+            stream=True,
         )
+        parts: List[str] = []
+        try:
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        finally:
+            stream.close()
+            self._record_reply("".join(parts), turn=0)
+        self._start_speculation()
 
-        opening = response.choices[0].message.content or ""
-        # Add to transcript as assistant message with timestamp
-        self.transcript.append({
-            "role": "assistant",
-            "content": opening,
-            "timestamp": datetime.now().isoformat(),
-            "turn": 0
-        })
-        return opening
+    async def get_opening_message_stream_async(self) -> AsyncIterator[str]:
+        """Async variant of get_opening_message_stream."""
+        stream = await self._acreate_completion(
+            model=self.model,
+            messages=self._build_opening_messages(),
+            temperature=self.temperature,
+            **self._sampling,
+            max_tokens=self.max_opening_tokens,
+            stream=True,
+        )
+        parts: List[str] = []
+        try:
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        finally:
+            await stream.close()
+            self._record_reply("".join(parts), turn=0)
+        self._start_speculation(in_loop=True)
 
     def get_response(self, user_message: str) -> str:
         """
@@ -297,52 +754,654 @@ Remember: Walking away is a last resort. Most negotiations should reach a deal o
         Returns:
             The opponent's response text
         """
+        if not self.raw_http:
+            return "".join(self.get_response_stream(user_message))
+
+        # The raw HTTP path has no streaming, so this one doesn't stream either
+        reply = self._begin_reply(user_message)
+        if reply is not None:
+            return reply
+        self._compact_history()
+        cache_key, messages, reply = self._prepare_reply()
+        if reply is not None:
+            return reply
+        if self._drafting():
+            reply = self._draft_reply(messages)
+        else:
+            reply = self._complete_text(messages, self.max_response_tokens)
+        return self._finish_reply(cache_key, reply)
+
+    def get_response_stream(self, user_message: str) -> Iterator[str]:
+        """
+        Streaming variant of get_response.
+
+        Yields reply text as tokens arrive so TTS/rendering can start on the
+        first token. The reply is added to the transcript once the stream
+        ends, including when the consumer stops early.
+        """
+        reply = self._begin_reply(user_message)
+        if reply is None:
+            self._compact_history()
+            cache_key, messages, reply = self._prepare_reply()
+            if reply is None and self._drafting():
+                reply = self._finish_reply(cache_key, self._draft_reply(messages))
+        if reply is not None:
+            yield reply
+            return
+
+        stream = self._create_completion(
+            model=self.model,
+            messages=messages,
+            temperature=self.temperature,
+            **self._sampling,
+            max_tokens=self.max_response_tokens,
+            stream=True,
+        )
+        parts: List[str] = []
+        completed = False
+        try:
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    yield delta
+            completed = True
+        finally:
+            stream.close()
+            self._finish_reply(cache_key, "".join(parts), completed)
+
+    async def get_response_async(self, user_message: str) -> str:
+        """
+        Async variant of get_response.
+
+        Lets the caller run other work (coach analysis, TTS) on the event
+        loop while the opponent reply is being generated.
+        """
+        reply = await self._abegin_reply(user_message)
+        if reply is not None:
+            return reply
+        await self._acompact_history()
+        cache_key, messages, reply = self._prepare_reply()
+        if reply is not None:
+            return reply
+
+        if self._drafting():
+            reply = await self._adraft_reply(messages)
+        else:
+            reply = await self._acomplete_shared(cache_key, messages)
+        return self._finish_reply(cache_key, reply)
+
+    async def get_response_stream_async(self, user_message: str) -> AsyncIterator[str]:
+        """
+        Streaming variant of get_response_async.
+
+        Yields reply text as tokens arrive so speech can start before the
+        whole reply is generated. The reply is added to the transcript once
+        the stream ends, including when the consumer stops early.
+        """
+        reply = await self._abegin_reply(user_message)
+        if reply is None:
+            await self._acompact_history()
+            cache_key, messages, reply = self._prepare_reply()
+            if reply is None and self._drafting():
+                reply = self._finish_reply(cache_key, await self._adraft_reply(messages))
+        if reply is not None:
+            yield reply
+            return
+
+        stream = await self._acreate_completion(
+            model=self.model,
+            messages=messages,
+            temperature=self.temperature,
+            **self._sampling,
+            max_tokens=self.max_response_tokens,
+            stream=True,
+        )
+        parts: List[str] = []
+        completed = False
+        try:
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    yield delta
+            completed = True
+        finally:
+            await stream.close()
+            self._finish_reply(cache_key, "".join(parts), completed)
+
+    @classmethod
+    async def batch_openings(cls, agents: Sequence["OpponentAgent"], concurrency: Optional[int] = None) -> List[str]:
+        """
+        Generates opening lines for many opponents concurrently.
+
+        Args:
+            agents: Opponents that have not opened yet
+            concurrency: Max requests in flight; defaults to GROQ_MAX_CONCURRENCY
+
+        Returns:
+            Opening lines in the same order as agents
+        """
+        if concurrency is None:
+            concurrency = int(os.getenv("GROQ_MAX_CONCURRENCY", "8"))
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def open_one(agent: "OpponentAgent") -> str:
+            async with semaphore:
+                return await agent.get_opening_message_async()
+
+        return await asyncio.gather(*(open_one(agent) for agent in agents))
+
+    @classmethod
+    async def batch_respond(
+        cls,
+        agents: Sequence["OpponentAgent"],
+        user_messages: Sequence[str],
+        concurrency: Optional[int] = None,
+    ) -> List[str]:
+        """
+        Replies to one user turn per opponent, concurrently.
+
+        Args:
+            agents: Opponents, each in its own negotiation
+            user_messages: The user's message for each agent, in the same order
+            concurrency: Max requests in flight; defaults to GROQ_MAX_CONCURRENCY
+
+        Returns:
+            Replies in the same order as agents
+        """
+        if len(agents) != len(user_messages):
+            raise ValueError("agents and user_messages must be the same length")
+        if concurrency is None:
+            concurrency = int(os.getenv("GROQ_MAX_CONCURRENCY", "8"))
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def respond(agent: "OpponentAgent", user_message: str) -> str:
+            async with semaphore:
+                return await agent.get_response_async(user_message)
+
+        return await asyncio.gather(*(respond(a, m) for a, m in zip(agents, user_messages)))
+
+    def _build_opening_messages(self) -> List[Dict[str, str]]:
+        opening_prompt = """The meeting is starting. Say a brief, natural greeting—just a sentence or two like a real person would. Don't over-explain or set up the whole negotiation. Keep it casual and short. No filler words, no stage directions."""
+
+        return [
+            self._system_msg,
+            {"role": "user", "content": opening_prompt}
+        ]
+
+    def _record_user_message(self, user_message: str) -> None:
         # Increment turn counter for user message
         self.current_turn += 1
 
-        # Add user message to transcript with timestamp
-        self.transcript.append({
-            "role": "user",
-            "content": user_message,
-            "timestamp": datetime.now().isoformat(),
-            "turn": self.current_turn
-        })
+        # Add user message to transcript; the ISO timestamp is filled in on export
+        entry = {"role": "user", "content": user_message, "turn": self.current_turn}
+        if self.log_timestamps:
+            entry["ts_ns"] = time.time_ns()
+        self.transcript.append(entry)
 
         if self._user_provided_price(user_message):
             self.user_price_anchor = user_message
+        self._set_phase(self._current_phase())
+
+    def _begin_reply(self, user_message: str) -> Optional[str]:
+        """
+        Shared front half of the sync get_response variants.
+
+        Records user_message and returns the recorded reply if a filler
+        continuer or the prefetched first reply answers it, else None.
+        """
+        self._record_user_message(user_message)
+        speculation = self._take_speculation(user_message)
+        filler = self._filler_reply(user_message)
+        if filler is not None:
+            if speculation is not None:
+                speculation.cancel()
+            return filler
+        if isinstance(speculation, Future):
+            try:
+                return self._record_reply(speculation.result(), turn=self.current_turn)
+            except Exception as e:
+                logger.debug(f"Speculative opponent reply failed: {e}")
+        elif speculation is not None:
+            # A task started by an async opening can't be awaited from here
+            speculation.cancel()
+        return None
+
+    async def _abegin_reply(self, user_message: str) -> Optional[str]:
+        """Async counterpart of _begin_reply."""
+        self._record_user_message(user_message)
+        speculation = self._take_speculation(user_message)
+        filler = self._filler_reply(user_message)
+        if filler is not None:
+            if speculation is not None:
+                speculation.cancel()
+            return filler
+        reply = await self._await_speculation(speculation)
+        if reply is not None:
+            return self._record_reply(reply, turn=self.current_turn)
+        return None
+
+    def _prepare_reply(self) -> Tuple[Optional[bytes], List[Dict[str, str]], Optional[str]]:
+        """
+        Builds the reply request and checks the response cache.
+
+        Returns (cache_key, messages, reply), where reply is the recorded
+        cached reply on a hit and None otherwise.
+        """
+        messages = self._build_response_messages()
+        cache_key = self._response_cache_key(messages)
+        cached = _cached_response(cache_key)
+        if cached is not None:
+            cached = self._record_reply(cached, turn=self.current_turn)
+        return cache_key, messages, cached
+
+    def _finish_reply(self, cache_key: Optional[bytes], reply: str, completed: bool = True) -> str:
+        """Records a freshly generated reply, caching it unless it was cut short."""
+        reply = self._record_reply(reply, turn=self.current_turn)
+        if completed:
+            _store_response(cache_key, reply)
+            # Only model replies are worth it; fillers and cache hits are instant
+            if self.prewarm_next:
+                self._schedule_prewarm()
+        return reply
+
+    def _filler_reply(self, user_message: str) -> Optional[str]:
+        """Records and returns a canned continuer if the user only said a filler."""
+        if not self.filler_replies:
+            return None
+        stripped = user_message.strip().lower().strip(".,!?… ")
+        if stripped not in _FILLER_UTTERANCES:
+            return None
+        # Seeded by turn so replays of a session pick the same line
+        reply = random.Random(self.current_turn).choice(_CONTINUERS)
+        return self._record_reply(reply, turn=self.current_turn)
+
+    def _start_speculation(self, in_loop: bool = False) -> None:
+        """Starts the prefetched first reply, if enabled, once the opening is recorded."""
+        if not self.speculate_first_reply:
+            return
+        messages = [self._system_msg, *self._llm_history(), {"role": "user", "content": _SPECULATIVE_GREETING}]
+        if in_loop:
+            pending = asyncio.ensure_future(self._acomplete_text(messages, self.max_response_tokens))
+        else:
+            pending = _speculation_pool().submit(self._complete_text, messages, self.max_response_tokens)
+        self._speculation = (pending, len(self.transcript) + 1, messages[0])
+
+    def _take_speculation(self, user_message: str) -> Optional[object]:
+        """
+        Claims the prefetched first reply if it still applies to this turn.
+
+        It applies when the conversation and system prompt are unchanged since
+        it was started and user_message reads like the greeting it assumed.
+        """
+        if self._speculation is None:
+            return None
+        pending, length, system_msg = self._speculation
+        self._speculation = None
+        ratio = difflib.SequenceMatcher(
+            None, user_message.strip().lower(), _SPECULATIVE_GREETING.lower()
+        ).ratio()
+        if (
+            length == len(self.transcript)
+            and system_msg is self._system_msg
+            and ratio >= self.speculate_threshold
+        ):
+            return pending
+        pending.cancel()
+        return None
+
+    async def _await_speculation(self, speculation: Optional[object]) -> Optional[str]:
+        if speculation is None:
+            return None
+        try:
+            if isinstance(speculation, Future):
+                return await asyncio.wrap_future(speculation)
+            return await speculation
+        except Exception as e:
+            logger.debug(f"Speculative opponent reply failed: {e}")
+            return None
+
+    def _current_phase(self) -> str:
+        if not self.phased_prompt:
+            return "all"
+        if self.current_turn >= self.bargaining_turn or self.user_price_anchor:
+            return "bargaining"
+        if self.current_turn >= self.exploration_turn:
+            return "exploration"
+        return "opening"
+
+    def _set_phase(self, phase: str) -> None:
+        """Points the shared system message at the given phase's prompt."""
+        if phase == self.phase:
+            return
+        rendered = self._phase_prompts.get(phase)
+        if rendered is None:
+            prompt = _render_phase_prompt(self._prompt_base, phase)
+            # Shared by every request so per-turn work is just a list build
+            message = {"role": "system", "content": prompt}
+            rendered = self._phase_prompts[phase] = (
+                prompt,
+                message,
+                hashlib.blake2b(prompt.encode(), digest_size=16).digest(),
+                serialize_message(message) if self.raw_http else b"",
+            )
+        self.phase = phase
+        self.system_prompt, self._system_msg, self._prompt_digest, self._system_blob = rendered
+        self._system_tokens = _prompt_tokens(self.system_prompt)
+        if self.cache_hint:
+            self._cache_headers = {"x-cache-hint": self._prompt_digest.hex()}
+
+    def full_transcript(self) -> List[Dict]:
+        """
+        The whole negotiation, including entries spilled to disk.
+
+        Returns self.transcript itself when nothing has been spilled. The
+        file is append-only, so it is parsed once and later spills extend
+        that copy; entries keep their identity across calls.
+        """
+        self._stamp_timestamps()
+        if self._spill_path is None:
+            return self.transcript
+        if self._spilled is None:
+            with open(self._spill_path, encoding="utf-8") as f:
+                self._spilled = [json.loads(line) for line in f]
+        return self._spilled + self.transcript
+
+    def transcript_length(self) -> int:
+        """len(full_transcript()) without reading the spill file."""
+        return self._spilled_count + len(self.transcript)
+
+    def close(self) -> None:
+        """Deletes the spill file; spilled entries are gone afterwards."""
+        if self._spill_finalizer is not None:
+            self._spill_finalizer()
+        self._spill_path = None
+        self._spill_finalizer = None
+        self._spilled = None
+        self._spilled_count = 0
+
+    def _stamp_timestamps(self) -> None:
+        """
+        Formats ISO "timestamp" fields for entries recorded since the last export.
+
+        Entries are stamped with an integer time_ns() on the hot path; the
+        string form consumers read (post-mortem, frontend) is produced here,
+        once per entry, in place so entry identity is preserved.
+        """
+        for entry in self.transcript[self._stamped:]:
+            if "timestamp" not in entry and "ts_ns" in entry:
+                entry["timestamp"] = datetime.fromtimestamp(entry["ts_ns"] / 1e9).isoformat()
+        self._stamped = len(self.transcript)
+
+    def _spill_cold_history(self) -> None:
+        """
+        Moves the oldest transcript entries to an append-only JSONL file.
 
-        # Use recent history for context (configurable, default higher for better continuity)
-        recent_transcript = self.transcript[-self.max_history_messages:] if self.max_history_messages > 0 else self.transcript
+        Only entries already folded into the history summary can go, since
+        the rest are still sent to the model verbatim.
+        """
+        limit = self.hot_transcript_limit
+        if limit <= 0 or len(self.transcript) <= 2 * limit:
+            return
+        count = min(limit, self._summary_cut)
+        if count <= 0:
+            return
+        if self._spill_path is None:
+            fd, self._spill_path = tempfile.mkstemp(prefix="opp_", suffix=".jsonl")
+            os.close(fd)
+            # Also runs at interpreter exit
+            self._spill_finalizer = weakref.finalize(self, _remove_spill, self._spill_path)
+        self._llm_history()
+        self._stamp_timestamps()
+        with open(self._spill_path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(entry) + "\n" for entry in self.transcript[:count])
+        if self._spilled is not None:
+            self._spilled.extend(self.transcript[:count])
+        self._spilled_count += count
+        del self.transcript[:count]
+        del self._llm_messages[:count]
+        del self._llm_tokens[:count]
+        if self._embeddings is not None:
+            self._embeddings = self._embeddings[count:]
+        self._stamped -= count
+        self._summary_cut -= count
 
-        # Build messages for LLM: system prompt + conversation history (only role and content)
-        messages = [{"role": "system", "content": self.system_prompt}]
+    def _build_response_messages(self) -> List[Dict[str, str]]:
+        """Builds the LLM request for the reply to the latest user message."""
+        self._spill_cold_history()
+        # Build messages for LLM: static system prompt + rolling summary +
+        # recent history (only role and content) + dynamic notes. The summary
+        # only changes when the window snaps forward, and anything that
+        # changes from turn to turn goes last, so the prefix stays cacheable.
+        head = self._request_system()
+        notes = []
+        recalled = self._recall_earlier()
+        if recalled:
+            lines = "\n".join(
+                f"{'User' if m['role'] == 'user' else 'You'}: {m['content']}" for m in recalled
+            )
+            notes.append({"role": "system", "content": f"Earlier messages relevant to this turn:\n{lines}"})
         if self.user_price_anchor:
-            messages.append({
+            notes.append({
                 "role": "system",
                 "content": (
                     "The user has already stated their target price or range. "
                     f"Do NOT ask for their target again. Their stated target: {self.user_price_anchor}"
                 ),
             })
-        for entry in recent_transcript:
-            messages.append({"role": entry["role"], "content": entry["content"]})
+        start = self._fitting_start(head[1:] + notes)
+        return head + self._llm_history()[start:] + notes
 
-        response = self._create_completion(
-            model=self.model,
-            messages=messages,
-            temperature=0.8,
-            max_tokens=self.max_response_tokens,
+    def _request_system(self) -> List[Dict[str, str]]:
+        """System prompt plus the rolling summary, if any."""
+        head = [self._system_msg]
+        if self.history_summary:
+            head.append({
+                "role": "system",
+                "content": f"Summary of the conversation so far: {self.history_summary}",
+            })
+        return head
+
+    def _request_head(self) -> List[Dict[str, str]]:
+        """
+        The cacheable part of the next reply request, without its notes.
+
+        Unlike _build_response_messages this neither spills history nor runs
+        recall, so it is safe to build right after a reply for prewarming.
+        """
+        return self._request_system() + self._llm_history()[self._summary_cut:]
+
+    def _fitting_start(self, extra: List[Dict[str, str]]) -> int:
+        """
+        First history index to send so the request fits the model's context.
+
+        Compaction normally keeps well inside it; this only bites when a
+        summary failed or the notes are unusually long. Dropped messages
+        stay in the transcript and are left out of this request only.
+        """
+        tokens = self._history_tokens()
+        start = self._summary_cut
+        # 64 tokens of slack for chat-format overhead and tokenizer mismatch
+        budget = self.context_tokens - self._system_tokens - self.max_response_tokens - 64
+        budget -= sum(count_tokens(m["content"]) for m in extra)
+        window = sum(tokens[start:])
+        if window <= budget:
+            return start
+        # Always keep the latest message
+        while window > budget and start < len(tokens) - 1:
+            window -= tokens[start]
+            start += 1
+        logger.warning(f"Opponent request over context; left out {start - self._summary_cut} oldest messages")
+        return start
+
+    def _recall_earlier(self) -> List[Dict[str, str]]:
+        """Top-K summarized messages most similar to the latest user message, oldest first."""
+        cut = self._summary_cut
+        if not self.retrieval_model or cut <= 0 or not self.transcript or self.transcript[-1]["role"] != "user":
+            return []
+        history = self._llm_history()
+        embedder = _load_embedder(self.retrieval_model)
+        # Each message is embedded once, when it leaves the verbatim window
+        done = 0 if self._embeddings is None else len(self._embeddings)
+        if done < cut:
+            rows = embedder.encode([m["content"] for m in history[done:cut]], normalize_embeddings=True)
+            self._embeddings = rows if self._embeddings is None else np.vstack([self._embeddings, rows])
+        query = embedder.encode([history[-1]["content"]], normalize_embeddings=True)[0]
+        scores = self._embeddings[:cut] @ query
+        top = np.argsort(-scores)[: self.retrieval_k]
+        return [history[i] for i in sorted(top.tolist())]
+
+    def _response_cache_key(self, messages: List[Dict[str, str]]) -> Optional[bytes]:
+        """Hash of the whole request; None once the conversation is too long to cache."""
+        if RESPONSE_CACHE_SIZE <= 0 or len(self.transcript) > RESPONSE_CACHE_MAX_MESSAGES:
+            return None
+        # The conversation is short here, so hashing all of it is cheap and
+        # avoids reusing a reply whose earlier context differed
+        key = hashlib.blake2b(self._prompt_digest, digest_size=16)
+        for message in messages[1:]:
+            key.update(f"\x00{message['role']}\x00{message['content']}".encode())
+        key.update(f"\x00{self.model}".encode())
+        return key.digest()
+
+    def _llm_history(self) -> List[Dict[str, str]]:
+        """
+        Role/content-only view of the transcript, kept in step with it.
+
+        self.transcript stays the public list of full entries (callers append
+        to it directly), so each new entry is projected once here instead of
+        the whole history being re-projected every turn.
+        """
+        if len(self._llm_messages) > len(self.transcript):
+            # Transcript was replaced; rebuild the view
+            self.close()
+            self._llm_messages = []
+            self._llm_tokens = []
+            self._embeddings = None
+        for entry in self.transcript[len(self._llm_messages):]:
+            self._llm_messages.append({"role": entry["role"], "content": entry["content"]})
+        return self._llm_messages
+
+    def _history_tokens(self) -> List[int]:
+        """Token counts aligned with _llm_history(), each message counted once."""
+        messages = self._llm_history()
+        for message in messages[len(self._llm_tokens):]:
+            self._llm_tokens.append(count_tokens(message["content"]))
+        return self._llm_tokens
+
+    def _pending_compaction(self) -> Optional[Tuple[int, List[Dict[str, str]]]]:
+        """
+        Returns (new window start, summary request) when the window should snap.
+
+        The window start only moves in steps of max_history_messages, so the
+        verbatim history holds between N and 2N-1 messages and the summary
+        message stays byte-identical for N turns at a time. It also moves
+        early, by whole exchanges, when the request would exceed its token
+        budget (see _budget_cut).
+        """
+        n = self.max_history_messages
+        if len(self.transcript) < self._summary_cut:
+            # Transcript was replaced; start over
+            self.history_summary = ""
+            self._summary_cut = 0
+        cut = max(0, (len(self.transcript) - n) // n * n) if n > 0 else 0
+        cut = max(cut, self._budget_cut())
+        if cut <= self._summary_cut:
+            return None
+
+        lines = "\n".join(
+            f"{'User' if m['role'] == 'user' else self.name}: {m['content']}"
+            for m in self.transcript[self._summary_cut:cut]
         )
+        if self.history_summary:
+            lines = f"Earlier summary: {self.history_summary}\n\nNew messages:\n{lines}"
+        return cut, [
+            {"role": "system", "content": _SUMMARY_PROMPT},
+            {"role": "user", "content": lines},
+        ]
 
-        opponent_response = response.choices[0].message.content or ""
-        # Add opponent response to transcript with timestamp
-        self.transcript.append({
-            "role": "assistant",
-            "content": opponent_response,
-            "timestamp": datetime.now().isoformat(),
-            "turn": self.current_turn
-        })
-        return opponent_response
+    def _budget_cut(self) -> int:
+        """Earliest window start that keeps the request within its token budget."""
+        budget = int(0.9 * self.context_tokens) - self.max_response_tokens
+        if self.max_prompt_tokens > 0:
+            budget = min(budget, self.max_prompt_tokens)
+        # The summary is about to be rewritten, so reserve its full size
+        budget -= self._system_tokens + self.max_summary_tokens
+        tokens = self._history_tokens()
+        cut = self._summary_cut
+        window = sum(tokens[cut:])
+        # Keep at least the latest exchange verbatim
+        while window > budget and cut + 2 < len(tokens):
+            window -= tokens[cut] + tokens[cut + 1]
+            cut += 2
+        return cut
+
+    def _apply_summary(self, cut: int, summary: str) -> None:
+        """
+        Moves the window start to cut, folding the dropped messages into summary.
+
+        A summary that isn't shorter than the earlier summary plus the
+        messages it replaces is discarded; the window still moves, so those
+        messages simply slide out.
+        """
+        replaced = sum(self._history_tokens()[self._summary_cut:cut])
+        if self.history_summary:
+            replaced += count_tokens(self.history_summary)
+        if summary and count_tokens(summary) < replaced:
+            self.history_summary = summary
+        else:
+            logger.debug("Opponent history summary did not shrink the prompt; sliding the window instead")
+        self._summary_cut = cut
+
+    def _compact_history(self) -> None:
+        pending = self._pending_compaction()
+        if pending is None:
+            return
+        cut, messages = pending
+        if not self.summary_model:
+            self._summary_cut = cut
+            return
+        try:
+            response = self._create_completion(
+                model=self.summary_model,
+                messages=messages,
+                temperature=0.2,
+                max_tokens=self.max_summary_tokens,
+            )
+        except Exception as e:
+            # Sending a longer window beats failing the reply
+            logger.warning(f"Opponent history summary failed, keeping full window: {e}")
+            return
+        self._apply_summary(cut, (response.choices[0].message.content or "").strip())
+
+    async def _acompact_history(self) -> None:
+        pending = self._pending_compaction()
+        if pending is None:
+            return
+        cut, messages = pending
+        if not self.summary_model:
+            self._summary_cut = cut
+            return
+        try:
+            response = await self._acreate_completion(
+                model=self.summary_model,
+                messages=messages,
+                temperature=0.2,
+                max_tokens=self.max_summary_tokens,
+            )
+        except Exception as e:
+            logger.warning(f"Opponent history summary failed, keeping full window: {e}")
+            return
+        self._apply_summary(cut, (response.choices[0].message.content or "").strip())
+
+    def _record_reply(self, reply: str, turn: int) -> str:
+        # Add opponent response to transcript as assistant message; the ISO
+        # timestamp is filled in on export
+        entry = {"role": "assistant", "content": reply, "turn": turn}
+        if self.log_timestamps:
+            entry["ts_ns"] = time.time_ns()
+        self.transcript.append(entry)
+        return reply
 
     def _user_provided_price(self, user_message: str) -> bool:
         lower = user_message.lower()
@@ -363,24 +1422,157 @@ Remember: Walking away is a last resort. Most negotiations should reach a deal o
         ]
         return any(keyword in lower for keyword in money_keywords)
 
-    def _create_completion(self, model: str, messages: List[Dict[str, str]], temperature: float, max_tokens: int):
-        try:
-            return self.client.chat.completions.create(
+    def _complete_text(self, messages: List[Dict[str, str]], max_tokens: int, model: Optional[str] = None) -> str:
+        """Non-streaming reply text, over raw HTTP when enabled."""
+        model = model or self.model
+        if not self.raw_http:
+            response = self._create_completion(
                 model=model,
                 messages=messages,
-                temperature=temperature,
+                temperature=self.temperature,
                 max_tokens=max_tokens,
+                **self._sampling,
             )
+            return response.choices[0].message.content or ""
+
+        # messages[0] is always self._system_msg; send its cached encoding
+        return raw_completion_text(
+            model,
+            messages[1:],
+            self.temperature,
+            max_tokens,
+            head=self._system_blob,
+            headers=self._cache_headers,
+            fallback_model=self.fallback_model,
+            **self._sampling,
+        )
+
+    async def _acomplete_text(self, messages: List[Dict[str, str]], max_tokens: int, model: Optional[str] = None) -> str:
+        model = model or self.model
+        if not self.raw_http:
+            response = await self._acreate_completion(
+                model=model,
+                messages=messages,
+                temperature=self.temperature,
+                max_tokens=max_tokens,
+                **self._sampling,
+            )
+            return response.choices[0].message.content or ""
+
+        return await araw_completion_text(
+            model,
+            messages[1:],
+            self.temperature,
+            max_tokens,
+            head=self._system_blob,
+            headers=self._cache_headers,
+            fallback_model=self.fallback_model,
+            **self._sampling,
+        )
+
+    async def _acomplete_shared(self, cache_key: Optional[bytes], messages: List[Dict[str, str]]) -> str:
+        """_acomplete_text, joining an identical request already in flight on this loop."""
+        if cache_key is None:
+            return await self._acomplete_text(messages, self.max_response_tokens)
+        loop = asyncio.get_running_loop()
+        task = _IN_FLIGHT.get(cache_key)
+        if task is not None and task.get_loop() is loop:
+            return await asyncio.shield(task)
+        task = loop.create_task(self._acomplete_text(messages, self.max_response_tokens))
+        _IN_FLIGHT[cache_key] = task
+        try:
+            # Shielded so one cancelled caller doesn't cancel the others
+            return await asyncio.shield(task)
+        finally:
+            if _IN_FLIGHT.get(cache_key) is task:
+                del _IN_FLIGHT[cache_key]
+
+    def _drafting(self) -> bool:
+        if not self.draft_model or self.draft_model == self.model:
+            return False
+        # Give the draft a fair sample before judging its acceptance rate
+        return self._draft_tried < 10 or self._draft_accepted * 2 >= self._draft_tried
+
+    def _accept_draft(self, draft: str, probe: str) -> bool:
+        """Keeps the draft when it opens with the main model's first tokens."""
+        probe = " ".join(probe.lower().split())
+        accepted = bool(probe) and " ".join(draft.lower().split()).startswith(probe)
+        self._draft_tried += 1
+        self._draft_accepted += accepted
+        return accepted
+
+    def _draft_reply(self, messages: List[Dict[str, str]]) -> str:
+        draft = _speculation_pool().submit(self._complete_text, messages, self.max_response_tokens, self.draft_model)
+        try:
+            probe = self._complete_text(messages, self.draft_check_tokens)
+            if self._accept_draft(draft.result(), probe):
+                return draft.result()
+        except Exception as e:
+            logger.debug(f"Opponent draft failed: {e}")
+        draft.cancel()
+        return self._complete_text(messages, self.max_response_tokens)
+
+    async def _adraft_reply(self, messages: List[Dict[str, str]]) -> str:
+        try:
+            draft, probe = await asyncio.gather(
+                self._acomplete_text(messages, self.max_response_tokens, self.draft_model),
+                self._acomplete_text(messages, self.draft_check_tokens),
+            )
+            if self._accept_draft(draft, probe):
+                return draft
         except Exception as e:
-            error_text = str(e).lower()
-            if "rate_limit" in error_text or "429" in error_text:
-                return self.client.chat.completions.create(
-                    model=self.fallback_model,
-                    messages=messages,
-                    temperature=temperature,
-                    max_tokens=max_tokens,
-                )
-            raise
+            logger.debug(f"Opponent draft failed: {e}")
+        return await self._acomplete_text(messages, self.max_response_tokens)
+
+    def _headers_for(self, messages: List[Dict[str, str]]) -> Optional[Dict[str, str]]:
+        # The hint names the opponent prompt, so summary calls go without it
+        return self._cache_headers if messages and messages[0] is self._system_msg else None
+
+    def _create_completion(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        stream: bool = False,
+        **sampling,
+    ):
+        if self.offline_mode:
+            return _offline_response(stream)
+        return create_completion(
+            self.client,
+            self.fallback_model,
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=stream,
+            extra_headers=self._headers_for(messages),
+            **sampling,
+        )
+
+    async def _acreate_completion(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        stream: bool = False,
+        **sampling,
+    ):
+        if self.offline_mode:
+            return _offline_response(stream, aio=True)
+        return await acreate_completion(
+            self.aclient,
+            self.fallback_model,
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=stream,
+            extra_headers=self._headers_for(messages),
+            **sampling,
+        )
 
     def get_hidden_state(self) -> Dict:
         """
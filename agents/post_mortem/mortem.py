@@ -1,8 +1,183 @@
 import os
+import re
 import json
+from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Dict
+from functools import cached_property, lru_cache
+from typing import AsyncIterator, List, Dict, Literal, Optional, Tuple, Union
 from google import genai
+from pydantic import BaseModel, ValidationError
+
+from agents._genai_client import get_genai_client
+from agents._jsonutil import dumps_compact, extract_first_json_object, loads
+
+
+Speaker = Literal["user", "opponent"]
+
+
+# Structure of the analysis. Sent to Gemini as the response schema, so
+# decoding is constrained to it, and used again to validate what comes back.
+class Tactic(BaseModel):
+    turn: int
+    timestamp: str
+    speaker: Speaker
+    tactic_name: str
+    quote: str
+    effectiveness: Literal["effective", "partially_effective", "ineffective", "backfired"]
+    analysis: str
+
+
+class MissedOpportunity(BaseModel):
+    turn: int
+    timestamp: str
+    what_user_said: str
+    opportunity: str
+    why_it_matters: str
+    better_response: str
+
+
+class InformationReveal(BaseModel):
+    turn: int
+    timestamp: str
+    speaker: Speaker
+    what_was_revealed: str
+    strategic_value: str
+    was_intentional: bool
+    how_it_was_used: str
+
+
+class TurningPoint(BaseModel):
+    turn: int
+    timestamp: str
+    description: str
+    impact: str
+    better_alternative: str
+
+
+class SecondaryObjective(BaseModel):
+    objective: str
+    achieved: bool
+    details: str
+
+
+class OutcomeAssessment(BaseModel):
+    primary_objective_achieved: bool
+    primary_objective_details: str
+    secondary_objectives: List[SecondaryObjective]
+    compared_to_batna: Literal["better", "equal", "worse"]
+    batna_comparison_details: str
+    value_captured: str
+    value_left_on_table: str
+    overall_rating: Literal["poor", "fair", "good", "excellent"]
+
+
+class OpponentPerspective(BaseModel):
+    satisfaction_level: Literal["frustrated", "disappointed", "neutral", "satisfied", "very_satisfied"]
+    what_opponent_got: str
+    what_opponent_gave_up: str
+    opponent_would_deal_again: bool
+
+
+class Lesson(BaseModel):
+    lesson: str
+    evidence: str
+    practice_tip: str
+
+
+class Summary(BaseModel):
+    one_sentence: str
+    biggest_win: str
+    biggest_miss: str
+    grade: Literal["A", "B", "C", "D", "F"]
+
+
+class PostMortemAnalysis(BaseModel):
+    # First, so analyze_streaming can surface the header before the details
+    summary: Summary
+    tactics_used: List[Tactic]
+    missed_opportunities: List[MissedOpportunity]
+    information_reveals: List[InformationReveal]
+    turning_points: List[TurningPoint]
+    outcome_assessment: OutcomeAssessment
+    opponent_perspective: OpponentPerspective
+    key_lessons: List[Lesson]
+
+
+# Summary fields analyze_streaming yields early, matched once their string
+# value has closed in the partial response
+_STREAMED_SUMMARY_FIELDS = ("one_sentence", "grade")
+_SUMMARY_FIELD = re.compile(r'"(one_sentence|grade)"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+# _parse_json fallback for a fenced markdown block
+_FENCED = re.compile(r'```(?:json)?\s*([\s\S]*?)\s*```')
+
+
+# Identical for every analysis, so it leads the system prompt and the
+# provider's prefix cache can reuse it across sessions. Everything specific
+# to a session follows it, and in the user prompt the transcript goes last.
+_ANALYST_PREAMBLE = """You are an expert negotiation analyst conducting a post-mortem review.
+
+Your job is to analyze the negotiation objectively, knowing what BOTH sides actually wanted and were constrained by. Help the user learn from this experience.
+
+You have COMPLETE INFORMATION about both parties (this was hidden during the negotiation):
+
+"""
+
+
+# Transcript roles as shown to the analyst and in the timeline; anything
+# other than the user is the opponent
+_ROLE_DISPLAY = {"user": "User", "assistant": "Opponent"}
+_ROLE_TIMELINE = {"user": "user", "assistant": "opponent"}
+
+
+# The user prompt around the transcript; only the transcript changes
+_ANALYSIS_HEAD = """Analyze this completed negotiation and provide a structured post-mortem.
+
+Return a JSON object matching the response schema: tactics used by either side, the user's
+missed opportunities, information revealed by either side, turning points, an outcome
+assessment against the user's objectives and BATNA, the opponent's perspective, key lessons
+and a graded summary.
+
+IMPORTANT INSTRUCTIONS:
+1. Use exact quotes from the transcript where possible
+2. Reference specific turn numbers and timestamps
+3. Be honest but constructive - this is for learning
+4. Consider what you now know about BOTH sides' hidden information
+5. Focus on actionable insights the user can apply next time
+
+TRANSCRIPT:
+"""
+_ANALYSIS_TAIL = """
+
+Return ONLY valid JSON, no other text."""
+
+
+def _prompt_value(value) -> str:
+    """Renders a briefing field for the prompt; dicts as compact JSON, which costs fewer tokens than indented."""
+    if isinstance(value, dict):
+        return dumps_compact(value)
+    return f"{value}"
+
+
+@dataclass(slots=True)
+class _PreparedTranscript:
+    """Transcript columns shared by _format_transcript and get_timeline."""
+    turns: List[int]
+    roles: List[str]
+    contents: List[str]
+    timestamps: List[Optional[str]]
+    times: List[Optional[datetime]]
+
+
+@lru_cache(maxsize=4096)
+def _parse_iso(timestamp) -> Optional[datetime]:
+    """Parses an ISO timestamp; the same strings recur across analyze and the timeline."""
+    if not timestamp:
+        return None
+    try:
+        return datetime.fromisoformat(timestamp)
+    except (ValueError, TypeError):
+        return None
 
 
 class PostMortemAgent:
@@ -25,7 +200,7 @@ class PostMortemAgent:
             opponent_hidden_state: Opponent's true constraints/objectives (from opponent.get_hidden_state())
             coach_config: Coach's context (what user knew going in)
         """
-        self.client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+        self.client = get_genai_client()
 
         # User's perspective
         self.user_objectives = user_briefing.get("objectives", {})
@@ -46,6 +221,13 @@ class PostMortemAgent:
         self.info_asymmetries = coach_config.get("info_asymmetries", "")
         self.coach_success_criteria = coach_config.get("success_criteria", "")
 
+        # (transcript, its length, columns) for the last transcript prepared
+        self._prepared: Optional[Tuple[List[Dict], int, _PreparedTranscript]] = None
+
+    @cached_property
+    def system_prompt(self) -> str:
+        return self._build_system_prompt()
+
     def analyze(self, transcript: List[Dict]) -> Dict:
         """
         Main analysis method. Analyzes the full negotiation transcript.
@@ -62,132 +244,197 @@ class PostMortemAgent:
         Returns:
             Structured analysis dict with tactics, opportunities, outcome, lessons
         """
-        formatted_transcript = self._format_transcript(transcript)
-
-        system_prompt = self._build_system_prompt()
-
-        analysis_prompt = f"""Analyze this completed negotiation and provide a structured post-mortem.
-
-TRANSCRIPT:
-{formatted_transcript}
-
-Analyze the negotiation and return a JSON object with this exact structure:
-
-{{
-    "tactics_used": [
-        {{
-            "turn": <number>,
-            "timestamp": "<time>",
-            "speaker": "user" | "opponent",
-            "tactic_name": "<name of tactic>",
-            "quote": "<exact quote from transcript>",
-            "effectiveness": "effective" | "partially_effective" | "ineffective" | "backfired",
-            "analysis": "<1-2 sentence explanation>"
-        }}
-    ],
-    "missed_opportunities": [
-        {{
-            "turn": <number>,
-            "timestamp": "<time>",
-            "what_user_said": "<what they actually said>",
-            "opportunity": "<what they could have done>",
-            "why_it_matters": "<why this would have helped>",
-            "better_response": "<specific example of what to say>"
-        }}
-    ],
-    "information_reveals": [
-        {{
-            "turn": <number>,
-            "timestamp": "<time>",
-            "speaker": "user" | "opponent",
-            "what_was_revealed": "<information that was disclosed>",
-            "strategic_value": "<why this information matters>",
-            "was_intentional": true | false,
-            "how_it_was_used": "<how the other party used or could have used this>"
-        }}
-    ],
-    "turning_points": [
-        {{
-            "turn": <number>,
-            "timestamp": "<time>",
-            "description": "<what happened>",
-            "impact": "<how this changed the negotiation direction>",
-            "better_alternative": "<what could have been done differently>"
-        }}
-    ],
-    "outcome_assessment": {{
-        "primary_objective_achieved": true | false,
-        "primary_objective_details": "<explanation>",
-        "secondary_objectives": [
-            {{"objective": "<goal>", "achieved": true | false, "details": "<explanation>"}}
-        ],
-        "compared_to_batna": "better" | "equal" | "worse",
-        "batna_comparison_details": "<explanation>",
-        "value_captured": "<what the user got>",
-        "value_left_on_table": "<what more could have been achieved>",
-        "overall_rating": "poor" | "fair" | "good" | "excellent"
-    }},
-    "opponent_perspective": {{
-        "satisfaction_level": "frustrated" | "disappointed" | "neutral" | "satisfied" | "very_satisfied",
-        "what_opponent_got": "<their gains>",
-        "what_opponent_gave_up": "<their concessions>",
-        "opponent_would_deal_again": true | false
-    }},
-    "key_lessons": [
-        {{
-            "lesson": "<specific actionable insight>",
-            "evidence": "<what in the transcript shows this>",
-            "practice_tip": "<how to work on this skill>"
-        }}
-    ],
-    "summary": {{
-        "one_sentence": "<one sentence summary of the negotiation>",
-        "biggest_win": "<the user's best move>",
-        "biggest_miss": "<the user's biggest missed opportunity>",
-        "grade": "A" | "B" | "C" | "D" | "F"
-    }}
-}}
-
-IMPORTANT INSTRUCTIONS:
-1. Use exact quotes from the transcript where possible
-2. Reference specific turn numbers and timestamps
-3. Be honest but constructive - this is for learning
-4. Consider what you now know about BOTH sides' hidden information
-5. Focus on actionable insights the user can apply next time
+        system_prompt = self.system_prompt
+        analysis_prompt = self._analysis_prompt(transcript)
+        model = os.getenv("GEMINI_POST_MORTEM_MODEL", "gemini-2.5-flash-lite")
+        max_tokens = int(os.getenv("GEMINI_POST_MORTEM_TOKENS", "4000"))
+        result = self._generate_analysis(
+            system_prompt=system_prompt,
+            analysis_prompt=analysis_prompt,
+            model=model,
+            max_tokens=max_tokens,
+            compact=False,
+        )
+        return self._finish_analysis(result, system_prompt, analysis_prompt, model, max_tokens)
 
-Return ONLY valid JSON, no other text."""
+    async def analyze_async(self, transcript: List[Dict]) -> Dict:
+        """
+        Async twin of analyze(), for callers on an event loop.
 
+        The Gemini calls (including any retry or repair) go through the
+        client's aio side, so the loop keeps serving other sessions while
+        the analysis runs.
+        """
+        system_prompt = self.system_prompt
+        analysis_prompt = self._analysis_prompt(transcript)
         model = os.getenv("GEMINI_POST_MORTEM_MODEL", "gemini-2.5-flash-lite")
         max_tokens = int(os.getenv("GEMINI_POST_MORTEM_TOKENS", "4000"))
-        result = self._generate_analysis(
+        result = await self._agenerate_analysis(
             system_prompt=system_prompt,
             analysis_prompt=analysis_prompt,
             model=model,
             max_tokens=max_tokens,
             compact=False,
         )
+        return await self._afinish_analysis(result, system_prompt, analysis_prompt, model, max_tokens)
+
+    async def analyze_streaming(self, transcript: List[Dict]) -> AsyncIterator[Dict]:
+        """
+        Streaming variant of analyze().
+
+        Yields {"summary": {<field>: <value>}} fragments for the summary's
+        one_sentence and grade as soon as they are complete in the stream,
+        so a UI can show the header early, then the full analysis (same
+        shape as analyze() returns) as the last item.
+        """
+        system_prompt = self.system_prompt
+        analysis_prompt = self._analysis_prompt(transcript)
+        model = os.getenv("GEMINI_POST_MORTEM_MODEL", "gemini-2.5-flash-lite")
+        max_tokens = int(os.getenv("GEMINI_POST_MORTEM_TOKENS", "4000"))
+
+        parts = []
+        pending = set(_STREAMED_SUMMARY_FIELDS)
+        stream = await self.client.aio.models.generate_content_stream(
+            model=model,
+            contents=analysis_prompt,
+            config=self._generation_config(system_prompt, max_tokens, compact=False),
+        )
+        async for chunk in stream:
+            text = self._extract_response_text(chunk, strip=False)
+            if not text:
+                continue
+            parts.append(text)
+            if not pending:
+                continue
+            for match in _SUMMARY_FIELD.finditer("".join(parts)):
+                field = match.group(1)
+                if field not in pending:
+                    continue
+                pending.discard(field)
+                try:
+                    value = json.loads(f'"{match.group(2)}"')
+                except json.JSONDecodeError:
+                    continue
+                yield {"summary": {field: value}}
+
+        # Retries and repair are rare and need the whole response anyway
+        yield await self._afinish_analysis(
+            "".join(parts).strip(), system_prompt, analysis_prompt, model, max_tokens
+        )
+
+    def _analysis_prompt(self, transcript: List[Dict]) -> str:
+        """Builds the user prompt for an analysis of the given transcript."""
+        formatted_transcript = self._format_transcript(transcript)
+
+        return _ANALYSIS_HEAD + formatted_transcript + _ANALYSIS_TAIL
+
+    def _finish_analysis(
+        self,
+        result: str,
+        system_prompt: str,
+        analysis_prompt: str,
+        model: str,
+        max_tokens: int,
+    ) -> Dict:
+        """Parses a raw analysis, retrying or repairing it once if needed."""
         parsed = self._parse_json(result)
         if parsed.get("parse_error"):
-            retry_tokens = int(os.getenv("GEMINI_POST_MORTEM_TOKENS_RETRY", "4000"))
-            retry_prompt = (
-                analysis_prompt
-                + "\n\nCRITICAL: Keep each list to 3 items max and keep text concise. "
-                "Return only valid JSON. No markdown."
+            result = self._generate_analysis(
+                system_prompt=system_prompt,
+                analysis_prompt=self._retry_prompt(analysis_prompt),
+                model=model,
+                max_tokens=int(os.getenv("GEMINI_POST_MORTEM_TOKENS_RETRY", "4000")),
+                compact=True,
             )
-            retry_result = self._generate_analysis(
+            parsed = self._parse_json(result)
+            if parsed.get("parse_error"):
+                return parsed
+
+        error = self._validation_error(parsed)
+        if error is None:
+            return parsed
+
+        repaired = self._parse_json(self._generate_analysis(
+            system_prompt=system_prompt,
+            analysis_prompt=self._repair_contents(analysis_prompt, result, error),
+            model=model,
+            max_tokens=max_tokens,
+            compact=True,
+        ))
+        return self._pick_repaired(parsed, repaired)
+
+    async def _afinish_analysis(
+        self,
+        result: str,
+        system_prompt: str,
+        analysis_prompt: str,
+        model: str,
+        max_tokens: int,
+    ) -> Dict:
+        """Async twin of _finish_analysis."""
+        parsed = self._parse_json(result)
+        if parsed.get("parse_error"):
+            result = await self._agenerate_analysis(
                 system_prompt=system_prompt,
-                analysis_prompt=retry_prompt,
+                analysis_prompt=self._retry_prompt(analysis_prompt),
                 model=model,
-                max_tokens=retry_tokens,
+                max_tokens=int(os.getenv("GEMINI_POST_MORTEM_TOKENS_RETRY", "4000")),
                 compact=True,
             )
-            return self._parse_json(retry_result)
-        return parsed
+            parsed = self._parse_json(result)
+            if parsed.get("parse_error"):
+                return parsed
+
+        error = self._validation_error(parsed)
+        if error is None:
+            return parsed
+
+        repaired = self._parse_json(await self._agenerate_analysis(
+            system_prompt=system_prompt,
+            analysis_prompt=self._repair_contents(analysis_prompt, result, error),
+            model=model,
+            max_tokens=max_tokens,
+            compact=True,
+        ))
+        return self._pick_repaired(parsed, repaired)
+
+    def _retry_prompt(self, analysis_prompt: str) -> str:
+        """The analysis prompt for a retry after an unparseable (usually truncated) answer."""
+        return (
+            analysis_prompt
+            + "\n\nCRITICAL: Keep each list to 3 items max and keep text concise. "
+            "Return only valid JSON. No markdown."
+        )
+
+    def _repair_contents(self, analysis_prompt: str, result: str, error: ValidationError) -> List[Dict]:
+        """One repair turn: shows the model its answer and what was wrong with it."""
+        return [
+            {"role": "user", "parts": [{"text": analysis_prompt}]},
+            {"role": "model", "parts": [{"text": result}]},
+            {"role": "user", "parts": [{"text": (
+                f"Your response failed schema validation:\n{error}\n\n"
+                "Return the corrected JSON only."
+            )}]},
+        ]
+
+    def _pick_repaired(self, parsed: Dict, repaired: Dict) -> Dict:
+        if repaired.get("parse_error") or self._validation_error(repaired) is not None:
+            # Keep the first answer; get_summary copes with missing fields
+            return parsed
+        return repaired
+
+    def _validation_error(self, analysis: Dict) -> Optional[ValidationError]:
+        """Checks an analysis against the schema; returns the error, if any."""
+        try:
+            PostMortemAnalysis.model_validate(analysis)
+        except ValidationError as e:
+            return e
+        return None
 
     def _generate_analysis(
         self,
         system_prompt: str,
-        analysis_prompt: str,
+        analysis_prompt: Union[str, List[Dict]],
         model: str,
         max_tokens: int,
         compact: bool,
@@ -195,15 +442,34 @@ Return ONLY valid JSON, no other text."""
         response = self.client.models.generate_content(
             model=model,
             contents=analysis_prompt,
-            config=genai.types.GenerateContentConfig(
-                system_instruction=system_prompt,
-                temperature=0.4 if not compact else 0.2,
-                max_output_tokens=max_tokens,
-                response_mime_type="application/json",
-            ),
+            config=self._generation_config(system_prompt, max_tokens, compact),
         )
         return self._extract_response_text(response)
 
+    async def _agenerate_analysis(
+        self,
+        system_prompt: str,
+        analysis_prompt: Union[str, List[Dict]],
+        model: str,
+        max_tokens: int,
+        compact: bool,
+    ) -> str:
+        response = await self.client.aio.models.generate_content(
+            model=model,
+            contents=analysis_prompt,
+            config=self._generation_config(system_prompt, max_tokens, compact),
+        )
+        return self._extract_response_text(response)
+
+    def _generation_config(self, system_prompt: str, max_tokens: int, compact: bool):
+        return genai.types.GenerateContentConfig(
+            system_instruction=system_prompt,
+            temperature=0.4 if not compact else 0.2,
+            max_output_tokens=max_tokens,
+            response_mime_type="application/json",
+            response_schema=PostMortemAnalysis,
+        )
+
     def get_summary(self, analysis: Dict) -> str:
         """
         Converts structured analysis to human-readable summary.
@@ -286,6 +552,10 @@ Return ONLY valid JSON, no other text."""
         Generates a reveal of what the opponent was actually thinking/constrained by.
         This is the "behind the curtain" moment.
         """
+        return self._opponent_reveal
+
+    @cached_property
+    def _opponent_reveal(self) -> str:
         lines = []
         lines.append("# What Your Opponent Was Really Thinking")
         lines.append(f"\n**{self.opponent_name}**\n")
@@ -316,31 +586,34 @@ Return ONLY valid JSON, no other text."""
         """
         Returns a timeline view for frontend visualization.
         """
+        prepared = self._prepare(transcript)
         timeline = []
         start_time = None
 
-        for msg in transcript:
+        for turn, role, content, timestamp, dt in zip(
+            prepared.turns, prepared.roles, prepared.contents, prepared.timestamps, prepared.times
+        ):
             entry = {
-                "turn": msg.get("turn", 0),
-                "role": "user" if msg["role"] == "user" else "opponent",
-                "content": msg["content"],
-                "timestamp": msg.get("timestamp"),
+                "turn": turn,
+                "role": _ROLE_TIMELINE.get(role, "opponent"),
+                "content": content,
+                "timestamp": timestamp,
                 "elapsed_seconds": None,
                 "elapsed_formatted": None
             }
 
-            timestamp = msg.get("timestamp")
-            if timestamp:
-                try:
-                    dt = datetime.fromisoformat(timestamp)
-                    if start_time is None:
-                        start_time = dt
+            if dt is not None:
+                if start_time is None:
+                    start_time = dt
 
+                try:
                     elapsed = (dt - start_time).total_seconds()
+                except TypeError:
+                    # Mixed naive and aware timestamps
+                    pass
+                else:
                     entry["elapsed_seconds"] = elapsed
                     entry["elapsed_formatted"] = f"{int(elapsed // 60)}:{int(elapsed % 60):02d}"
-                except (ValueError, TypeError):
-                    pass
 
             timeline.append(entry)
 
@@ -348,16 +621,12 @@ Return ONLY valid JSON, no other text."""
 
     def _build_system_prompt(self) -> str:
         """Builds system prompt with full context from both sides."""
-        return f"""You are an expert negotiation analyst conducting a post-mortem review.
+        return _ANALYST_PREAMBLE + f"""=== USER'S POSITION ===
+Objectives: {_prompt_value(self.user_objectives)}
 
-You have COMPLETE INFORMATION about both parties (this was hidden during the negotiation):
+BATNA (walkaway): {_prompt_value(self.user_batna)}
 
-=== USER'S POSITION ===
-Objectives: {json.dumps(self.user_objectives, indent=2) if isinstance(self.user_objectives, dict) else self.user_objectives}
-
-BATNA (walkaway): {json.dumps(self.user_batna, indent=2) if isinstance(self.user_batna, dict) else self.user_batna}
-
-Success Criteria: {json.dumps(self.user_success_criteria, indent=2) if isinstance(self.user_success_criteria, dict) else self.user_success_criteria}
+Success Criteria: {_prompt_value(self.user_success_criteria)}
 
 Negotiable Items: {self.user_negotiables}
 
@@ -378,20 +647,38 @@ Planned Tactics/Disposition: {self.opponent_disposition}
 {self.info_asymmetries}
 
 === POINTS OF TENSION ===
-{self.known_tensions}
+{self.known_tensions}"""
 
-Your job is to analyze the negotiation objectively, knowing what BOTH sides actually wanted and were constrained by. Help the user learn from this experience."""
+    def _prepare(self, transcript: List[Dict]) -> _PreparedTranscript:
+        """
+        Splits the transcript into parallel columns, parsing timestamps once.
+
+        Kept for the last transcript seen, so get_timeline() after an
+        analysis of the same (unchanged) list reuses the work.
+        """
+        cached = self._prepared
+        if cached is not None and cached[0] is transcript and cached[1] == len(transcript):
+            return cached[2]
+        timestamps = [msg.get("timestamp") for msg in transcript]
+        prepared = _PreparedTranscript(
+            turns=[msg.get("turn", 0) for msg in transcript],
+            roles=[msg["role"] for msg in transcript],
+            contents=[msg["content"] for msg in transcript],
+            timestamps=timestamps,
+            times=[_parse_iso(ts) for ts in timestamps],
+        )
+        self._prepared = (transcript, len(transcript), prepared)
+        return prepared
 
     def _format_transcript(self, transcript: List[Dict]) -> str:
         """Formats transcript with turn numbers and timestamps."""
+        prepared = self._prepare(transcript)
         lines = []
         current_turn = None
 
-        for msg in transcript:
-            turn = msg.get("turn", 0)
-            timestamp = msg.get("timestamp", "")
-            role = "User" if msg["role"] == "user" else "Opponent"
-
+        for turn, role, content, timestamp, dt in zip(
+            prepared.turns, prepared.roles, prepared.contents, prepared.timestamps, prepared.times
+        ):
             # Turn header
             if turn != current_turn and turn > 0:
                 current_turn = turn
@@ -400,48 +687,44 @@ Your job is to analyze the negotiation objectively, knowing what BOTH sides actu
             # Format timestamp
             time_str = ""
             if timestamp:
-                try:
-                    dt = datetime.fromisoformat(timestamp)
-                    time_str = f"[{dt.strftime('%H:%M:%S')}] "
-                except (ValueError, TypeError):
-                    time_str = f"[{timestamp}] "
+                time_str = f"[{dt.strftime('%H:%M:%S')}] " if dt is not None else f"[{timestamp}] "
 
-            lines.append(f"{time_str}{role}: {msg['content']}")
+            lines.append(f"{time_str}{_ROLE_DISPLAY.get(role, 'Opponent')}: {content}")
 
         return "\n".join(lines)
 
     def _parse_json(self, text: str) -> Dict:
         """Attempts to parse JSON from LLM response."""
-        # Try direct parse
+        # Schema-constrained output parses directly; the fallbacks below only
+        # cover a truncated or wrapped response
         try:
-            return json.loads(text)
+            return loads(text)
         except json.JSONDecodeError:
             pass
 
         # Try extracting from markdown code block
-        import re
-        json_match = re.search(r'```(?:json)?\s*([\s\S]*?)\s*```', text)
+        json_match = _FENCED.search(text)
         if json_match:
             try:
-                return json.loads(json_match.group(1))
+                return loads(json_match.group(1))
             except json.JSONDecodeError:
                 pass
 
         # Try finding JSON object
-        json_match = re.search(r'\{[\s\S]*\}', text)
-        if json_match:
+        candidate = extract_first_json_object(text)
+        if candidate:
             try:
-                return json.loads(json_match.group(0))
+                return loads(candidate)
             except json.JSONDecodeError:
                 pass
 
         # Return error with raw text
         return {"parse_error": True, "raw_response": text}
 
-    def _extract_response_text(self, response) -> str:
-        """Extracts text from a Gemini response safely."""
+    def _extract_response_text(self, response, strip: bool = True) -> str:
+        """Extracts text from a Gemini response (or stream chunk) safely."""
         if hasattr(response, "text") and response.text:
-            return response.text.strip()
+            return response.text.strip() if strip else response.text
 
         candidates = getattr(response, "candidates", None) or []
         for candidate in candidates:
@@ -452,6 +735,6 @@ Your job is to analyze the negotiation objectively, knowing what BOTH sides actu
             for part in parts:
                 text = getattr(part, "text", None)
                 if text:
-                    return text.strip()
+                    return text.strip() if strip else text
 
         return ""
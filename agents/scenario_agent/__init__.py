@@ -1,2 +1,2 @@
 # Scenario generation agent
-from .scenario import generate_scenario
+from .scenario import agenerate_scenario, generate_scenario, generate_scenarios
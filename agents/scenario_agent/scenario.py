@@ -1,80 +1,181 @@
 import os
 from google import genai
-from groq import Groq
 import json
+import asyncio
 import logging
 import re
-from typing import Dict
+from typing import Dict, List, Optional
 
+from agents._genai_client import get_genai_client
+from agents._groq_client import acreate_completion, create_completion, get_async_client, get_client
+from agents._jsonutil import extract_first_json_object, loads
 from agents.scenario_agent.scenario_prompt import create_prompt
 
 logger = logging.getLogger(__name__)
 
+# Patterns used by _parse_json_response, compiled once
+_FENCED = re.compile(r'```(?:json)?\s*([\s\S]*?)\s*```')
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_INVALID_CONTROLS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+# For parsing a JSON prefix that has trailing text; orjson has no equivalent
+_DECODER = json.JSONDecoder()
+
 # generates negotiation scenario and returns outputs for user, opponent, and coach
 
 
 def generate_scenario(context: str) -> Dict:
-    client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-    model = os.getenv("GEMINI_SCENARIO_MODEL", "gemini-2.5-flash-lite")
-    fallback_model = os.getenv("GEMINI_SCENARIO_FALLBACK_MODEL", "gemini-2.5-flash")
-    groq_fallback_model = os.getenv("GROQ_SCENARIO_FALLBACK_MODEL", "llama-3.1-8b-instant")
-    logger.info(f"Scenario generation model: {model}")
-    prompt = create_prompt(context)
-
-    def _request(model_name: str, max_tokens: int, compact: bool):
-        contents = prompt
-        if compact:
-            contents += (
-                "\n\nCRITICAL: Keep all fields concise. Limit any list to 3 items. "
-                "Keep user_narrative to 2 short paragraphs."
-            )
-        return client.models.generate_content(
-            model=model_name,
-            contents=contents,
-            config=genai.types.GenerateContentConfig(
-                temperature=0.4,
-                max_output_tokens=max_tokens,
-                response_mime_type="application/json",
-            ),
+    logger.info(f"Scenario generation model: {_scenario_model()}")
+    return _assemble_scenario(_request_scenario(create_prompt(context)))
+
+
+async def agenerate_scenario(context: str) -> Dict:
+    """Async twin of generate_scenario, for callers on an event loop."""
+    logger.info(f"Scenario generation model: {_scenario_model()}")
+    return _assemble_scenario(await _arequest_scenario(create_prompt(context)))
+
+
+async def generate_scenarios(contexts: List[str], concurrency: Optional[int] = None) -> List[object]:
+    """
+    Generates many scenarios concurrently.
+
+    Args:
+        contexts: One scenario description per scenario
+        concurrency: Max scenarios in flight; defaults to GEMINI_MAX_CONCURRENCY
+
+    Returns:
+        Scenarios in the same order as contexts; a failed scenario yields its
+        exception instead of aborting the batch.
+    """
+    if concurrency is None:
+        concurrency = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def generate_one(context: str) -> Dict:
+        async with semaphore:
+            return await agenerate_scenario(context)
+
+    return await asyncio.gather(
+        *(generate_one(context) for context in contexts),
+        return_exceptions=True,
+    )
+
+
+def _scenario_model() -> str:
+    return os.getenv("GEMINI_SCENARIO_MODEL", "gemini-2.5-flash-lite")
+
+
+def _scenario_request(prompt: str, model_name: str, max_tokens: int, compact: bool) -> Dict:
+    """Keyword arguments for one Gemini scenario request."""
+    contents = prompt
+    if compact:
+        contents += (
+            "\n\nCRITICAL: Keep all fields concise. Limit any list to 3 items. "
+            "Keep user_narrative to 2 short paragraphs."
         )
+    return {
+        "model": model_name,
+        "contents": contents,
+        "config": genai.types.GenerateContentConfig(
+            temperature=0.4,
+            max_output_tokens=max_tokens,
+            response_mime_type="application/json",
+        ),
+    }
+
+
+def _groq_fallback_request(prompt: str) -> Dict:
+    """Keyword arguments for the Groq fallback, used when Gemini can't produce a scenario."""
+    model = os.getenv("GROQ_SCENARIO_FALLBACK_MODEL", "llama-3.1-8b-instant")
+    return {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": "Return only valid JSON that matches the requested schema."},
+            {"role": "user", "content": prompt},
+        ],
+        # JSON mode: Groq rejects anything that isn't a single JSON object
+        "response_format": {"type": "json_object"},
+        "temperature": 0.4,
+        "max_tokens": int(os.getenv("GROQ_SCENARIO_TOKENS", "900")),
+    }
+
+
+def _is_overloaded(error: Exception) -> bool:
+    error_text = str(error).lower()
+    return "503" in error_text or "unavailable" in error_text or "overloaded" in error_text
+
 
+def _first_request(prompt: str) -> Dict:
+    """The initial Gemini request, on the configured scenario model."""
     max_tokens = int(os.getenv("GEMINI_SCENARIO_TOKENS", "8000"))
+    return _scenario_request(prompt, _scenario_model(), max_tokens, compact=False)
+
+
+def _retry_request(prompt: str, error: Exception, response) -> Optional[Dict]:
+    """
+    The Gemini retry for a failed first attempt, or None if retrying won't help.
+
+    An overloaded model is retried on the fallback model; a truncated reply is
+    retried with a larger budget and a compact prompt.
+    """
+    if _is_overloaded(error):
+        logger.warning("Scenario model overloaded; retrying with fallback model.")
+        fallback_model = os.getenv("GEMINI_SCENARIO_FALLBACK_MODEL", "gemini-2.5-flash")
+        max_tokens = int(os.getenv("GEMINI_SCENARIO_TOKENS", "8000"))
+        return _scenario_request(prompt, fallback_model, max_tokens, compact=False)
+
+    texts = _collect_response_texts(response) if response is not None else []
+    sample = texts[0] if texts else ""
+    if _is_truncated(sample):
+        retry_tokens = int(os.getenv("GEMINI_SCENARIO_TOKENS_RETRY", "8000"))
+        logger.warning(f"Response truncated (sample length: {len(sample)}), retrying with {retry_tokens} tokens and compact prompt")
+        return _scenario_request(prompt, _scenario_model(), retry_tokens, compact=True)
+    return None
+
+
+def _parse_groq_scenario(groq_response) -> Dict:
+    return _parse_json_response(groq_response.choices[0].message.content or "")
+
+
+def _request_scenario(prompt: str) -> Dict:
+    """Requests and parses a scenario: Gemini first, then its fallbacks, then Groq."""
+    client = get_genai_client()
+    response = None
+    try:
+        response = client.models.generate_content(**_first_request(prompt))
+        return _extract_scenario_from_response(response)
+    except Exception as e:
+        try:
+            retry = _retry_request(prompt, e, response)
+            if retry is None:
+                raise
+            return _extract_scenario_from_response(client.models.generate_content(**retry))
+        except Exception:
+            logger.warning("Gemini scenario parsing failed; falling back to Groq.")
+            request = _groq_fallback_request(prompt)
+            return _parse_groq_scenario(create_completion(get_client(), request["model"], **request))
+
+
+async def _arequest_scenario(prompt: str) -> Dict:
+    """Async twin of _request_scenario."""
+    client = get_genai_client()
     response = None
     try:
-        response = _request(model, max_tokens, compact=False)
-        scenario = _extract_scenario_from_response(response)
+        response = await client.aio.models.generate_content(**_first_request(prompt))
+        return _extract_scenario_from_response(response)
     except Exception as e:
-        texts = _collect_response_texts(response) if response is not None else []
-        sample = texts[0] if texts else ""
-        error_text = str(e).lower()
         try:
-            if "503" in error_text or "unavailable" in error_text or "overloaded" in error_text:
-                logger.warning("Scenario model overloaded; retrying with fallback model.")
-                response = _request(fallback_model, max_tokens, compact=False)
-                scenario = _extract_scenario_from_response(response)
-            elif _is_truncated(sample):
-                retry_tokens = int(os.getenv("GEMINI_SCENARIO_TOKENS_RETRY", "8000"))
-                logger.warning(f"Response truncated (sample length: {len(sample)}), retrying with {retry_tokens} tokens and compact prompt")
-                response = _request(model, retry_tokens, compact=True)
-                scenario = _extract_scenario_from_response(response)
-            else:
+            retry = _retry_request(prompt, e, response)
+            if retry is None:
                 raise
+            return _extract_scenario_from_response(await client.aio.models.generate_content(**retry))
         except Exception:
             logger.warning("Gemini scenario parsing failed; falling back to Groq.")
-            groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-            groq_response = groq_client.chat.completions.create(
-                model=groq_fallback_model,
-                messages=[
-                    {"role": "system", "content": "Return only valid JSON that matches the requested schema. No extra text."},
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=0.4,
-                max_tokens=int(os.getenv("GROQ_SCENARIO_TOKENS", "900")),
-            )
-            scenario_text = groq_response.choices[0].message.content or ""
-            scenario = _parse_json_response(scenario_text)
-    # scenario is parsed above
+            request = _groq_fallback_request(prompt)
+            return _parse_groq_scenario(await acreate_completion(get_async_client(), request["model"], **request))
+
 
+def _assemble_scenario(scenario: Dict) -> Dict:
+    """Turns a parsed scenario into the briefings and agent configs callers use."""
     # Transform opponent data into format OpponentAgent expects
     opponent_agent_config = _build_opponent_config(
         scenario["shared_context"],
@@ -427,7 +528,7 @@ def _parse_json_response(response_text: str) -> Dict:
         if text.startswith('"""') and text.endswith('"""'):
             text = text[3:-3].strip()
         # Remove trailing commas before closing braces/brackets.
-        text = re.sub(r",\s*([}\]])", r"\1", text)
+        text = _TRAILING_COMMA.sub(r"\1", text)
         return text
 
     def _escape_control_chars(text: str) -> str:
@@ -456,12 +557,11 @@ def _parse_json_response(response_text: str) -> Dict:
 
     def _strip_invalid_controls(text: str) -> str:
         # Remove non-printable control chars (except whitespace) that break json parsing.
-        return re.sub(r"[\x00-\x08\x0b\x0c\x0e-\x1f]", "", text)
+        return _INVALID_CONTROLS.sub("", text)
 
     def _raw_decode(text: str) -> Dict | None:
-        decoder = json.JSONDecoder()
         try:
-            obj, _ = decoder.raw_decode(text)
+            obj, _ = _DECODER.raw_decode(text)
             return obj
         except json.JSONDecodeError:
             return None
@@ -469,18 +569,30 @@ def _parse_json_response(response_text: str) -> Dict:
     def _try_load(text: str) -> Dict | None:
         if not text:
             return None
+        try:
+            return loads(text)
+        except json.JSONDecodeError:
+            pass
+        # Lenient about raw control characters inside strings
         try:
             return json.loads(text, strict=False)
         except json.JSONDecodeError:
             return None
 
+    # JSON-mode output parses as-is; everything below is for wrapped or
+    # slightly malformed text
+    try:
+        return loads(response_text)
+    except json.JSONDecodeError:
+        pass
+
     # First sanitize the input
     cleaned = _sanitize_json(_strip_invalid_controls(response_text))
     direct = _try_load(cleaned) or _raw_decode(cleaned)
     if direct is not None:
         return direct
 
-    json_match = re.search(r'```(?:json)?\s*([\s\S]*?)\s*```', response_text)
+    json_match = _FENCED.search(response_text)
     if json_match:
         candidate = json_match.group(1)
         candidate = _strip_invalid_controls(candidate)
@@ -518,10 +630,8 @@ def _parse_json_response(response_text: str) -> Dict:
         if parsed is not None:
             return parsed
 
-    first = response_text.find("{")
-    last = response_text.rfind("}")
-    if first != -1 and last != -1 and last > first:
-        candidate = response_text[first:last + 1]
+    candidate = extract_first_json_object(response_text)
+    if candidate:
         parsed = _try_load(candidate) or _raw_decode(candidate)
         if parsed is None:
             sanitized = _sanitize_json(candidate)
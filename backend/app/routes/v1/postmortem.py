@@ -449,7 +449,7 @@ async def request_post_mortem(request: PostMortemRequest):
 
         # Run analysis
         logger.info(f"Running post-mortem analysis for {session_id} with {len(transcript)} messages")
-        analysis = agent.analyze(transcript)
+        analysis = await agent.analyze_async(transcript)
 
         previous_analysis = None
         supabase = get_supabase_client()
@@ -4,7 +4,7 @@ from typing import Dict, Optional
 import json
 from .negotiation import negotiation_router
 
-from agents.scenario_agent.scenario import generate_scenario
+from agents.scenario_agent.scenario import agenerate_scenario
 
 logger = logging.getLogger(__name__)
 
@@ -188,7 +188,7 @@ async def update_scenario_info(session_id: str, scenario_info: str):
     if not session:
         return {"error": "Session not found", "session_id": session_id}
     
-    scenario_para = generate_scenario(scenario_info)
+    scenario_para = await agenerate_scenario(scenario_info)
     logger.info(f"Session {session_id}: Scenario info updated")
     
     return {
@@ -28,7 +28,7 @@ sys.path.append(os.path.join(os.path.dirname(__file__), "../../../.."))
 from pydantic import BaseModel
 from supabase import create_client, Client
 from app.core.config import settings
-from agents.scenario_agent.scenario import generate_scenario
+from agents.scenario_agent.scenario import agenerate_scenario
 from deepgram import DeepgramClient, DeepgramClientOptions, LiveOptions, LiveTranscriptionEvents
 try:
     from cartesia import Cartesia
@@ -368,12 +368,12 @@ class NegotiationSession:
                 # Generate and stream closing audio
                 await self.generate_and_stream_audio(closing_message)
 
-                final_advice = self.coach.get_final_advice(self.opponent.transcript)
+                final_advice = await self.coach.get_final_advice_async(self.opponent.full_transcript())
                 hidden_state = self.opponent.get_hidden_state()
 
                 # Store session data for post-mortem analysis
                 store_session_data(self.session_id, {
-                    "transcript": self.opponent.transcript,
+                    "transcript": self.opponent.full_transcript(),
                     "opponent_config": self.scenario_data.get("opponent", {}),
                     "coach_config": self.scenario_data.get("coach", {}),
                     "hidden_state": hidden_state,
@@ -385,14 +385,14 @@ class NegotiationSession:
                     "type": "negotiation_complete",
                     "final_advice": final_advice,
                     "hidden_state": hidden_state,
-                    "transcript": self.opponent.transcript,
+                    "transcript": self.opponent.full_transcript(),
                     "auto_ended": True
                 })
                 self.closed = True
                 return
 
             # Get opponent response
-            opponent_response = self.opponent.get_response(user_text)
+            opponent_response = await self.opponent.get_response_async(user_text)
             logger.info(f"Session {self.session_id}: Opponent response: {opponent_response}")
 
             # Send text response to frontend
@@ -401,20 +401,37 @@ class NegotiationSession:
                 "text": opponent_response
             })
 
+            deal_closed = self._is_deal_closed(opponent_response)
+            walked_away = not deal_closed and self._is_walkaway(opponent_response)
+
+            # The coach only needs the text of this exchange, so let it run
+            # while the reply is being spoken instead of after the audio
+            coach_task = None
+            if not (deal_closed or walked_away):
+                coach_task = asyncio.create_task(
+                    self.coach.analyze_turn_async(list(self.opponent.full_transcript()))
+                )
+
             # Generate audio from opponent response
-            await self.generate_and_stream_audio(opponent_response)
+            try:
+                await self.generate_and_stream_audio(opponent_response)
+            except BaseException:
+                # Includes cancellation; don't leave the coach call running
+                if coach_task is not None:
+                    coach_task.cancel()
+                raise
 
             self.opponent_turns += 1
 
             # Check if opponent closed the deal
-            if self._is_deal_closed(opponent_response):
+            if deal_closed:
                 logger.info(f"Session {self.session_id}: Deal closed by opponent")
-                final_advice = self.coach.get_final_advice(self.opponent.transcript)
+                final_advice = await self.coach.get_final_advice_async(self.opponent.full_transcript())
                 hidden_state = self.opponent.get_hidden_state()
 
                 # Store session data for post-mortem analysis
                 store_session_data(self.session_id, {
-                    "transcript": self.opponent.transcript,
+                    "transcript": self.opponent.full_transcript(),
                     "opponent_config": self.scenario_data.get("opponent", {}),
                     "coach_config": self.scenario_data.get("coach", {}),
                     "hidden_state": hidden_state,
@@ -426,7 +443,7 @@ class NegotiationSession:
                     "type": "negotiation_complete",
                     "final_advice": final_advice,
                     "hidden_state": hidden_state,
-                    "transcript": self.opponent.transcript,
+                    "transcript": self.opponent.full_transcript(),
                     "auto_ended": True
                 })
                 self.closed = True
@@ -434,14 +451,14 @@ class NegotiationSession:
                 return
 
             # Check if opponent walked away from the negotiation
-            if self._is_walkaway(opponent_response):
+            if walked_away:
                 logger.info(f"Session {self.session_id}: Opponent walked away from negotiation")
-                final_advice = self.coach.get_final_advice(self.opponent.transcript)
+                final_advice = await self.coach.get_final_advice_async(self.opponent.full_transcript())
                 hidden_state = self.opponent.get_hidden_state()
 
                 # Store session data for post-mortem analysis
                 store_session_data(self.session_id, {
-                    "transcript": self.opponent.transcript,
+                    "transcript": self.opponent.full_transcript(),
                     "opponent_config": self.scenario_data.get("opponent", {}),
                     "coach_config": self.scenario_data.get("coach", {}),
                     "hidden_state": hidden_state,
@@ -453,7 +470,7 @@ class NegotiationSession:
                     "type": "negotiation_complete",
                     "final_advice": final_advice,
                     "hidden_state": hidden_state,
-                    "transcript": self.opponent.transcript,
+                    "transcript": self.opponent.full_transcript(),
                     "auto_ended": True,
                     "walked_away": True
                 })
@@ -463,7 +480,7 @@ class NegotiationSession:
             # Coach tips: show after the first opponent reply for the next 3 turns,
             # then only surface critical guidance.
             self.user_turns += 1
-            coach_tip = self.coach.analyze_turn(self.opponent.transcript)
+            coach_tip = await coach_task
             is_early_window = 2 <= self.opponent_turns <= 4
             is_critical = False
             if coach_tip:
@@ -669,7 +686,7 @@ class NegotiationSession:
     async def get_opening_message(self):
         """Get opponent's opening message to start negotiation"""
         try:
-            opening = self.opponent.get_opening_message()
+            opening = await self.opponent.get_opening_message_async()
 
             # Send opening text
             await self.websocket.send_json({
@@ -699,6 +716,7 @@ class NegotiationSession:
         self.dg_connection = None
         self.dg_connected = False
         self.closed = True
+        self.opponent.close()
         logger.info(f"Session {self.session_id}: Cleaned up")
 
 
@@ -777,12 +795,12 @@ async def websocket_negotiation(websocket: WebSocket, session_id: str):
 
                 if msg_type == "end_negotiation":
                     # Get final analysis from coach
-                    final_advice = session.coach.get_final_advice(session.opponent.transcript)
+                    final_advice = await session.coach.get_final_advice_async(session.opponent.full_transcript())
                     hidden_state = session.opponent.get_hidden_state()
 
                     # Store session data for post-mortem analysis
                     store_session_data(session_id, {
-                        "transcript": session.opponent.transcript,
+                        "transcript": session.opponent.full_transcript(),
                         "opponent_config": session.scenario_data.get("opponent", {}),
                         "coach_config": session.scenario_data.get("coach", {}),
                         "hidden_state": hidden_state,
@@ -793,14 +811,14 @@ async def websocket_negotiation(websocket: WebSocket, session_id: str):
                         "type": "negotiation_complete",
                         "final_advice": final_advice,
                         "hidden_state": hidden_state,
-                        "transcript": session.opponent.transcript
+                        "transcript": session.opponent.full_transcript()
                     })
                     break
 
                 elif msg_type == "get_transcript":
                     await websocket.send_json({
                         "type": "transcript",
-                        "transcript": session.opponent.transcript
+                        "transcript": session.opponent.full_transcript()
                     })
 
                 elif msg_type == "barge_in":
@@ -836,7 +854,7 @@ async def get_negotiation_session(session_id: str):
     session = active_sessions[session_id]
     return {
         "session_id": session_id,
-        "transcript_length": len(session.opponent.transcript),
+        "transcript_length": session.opponent.transcript_length(),
         "status": "active"
     }
 
@@ -848,7 +866,7 @@ class ScenarioContextRequest(BaseModel):
 @negotiation_router.post("/scenario_context")
 async def create_scenario_context(payload: ScenarioContextRequest):
     try:
-        scenario = generate_scenario(payload.keywords)
+        scenario = await agenerate_scenario(payload.keywords)
         if not isinstance(scenario, dict):
             raise ValueError("Scenario generation failed")
 
@@ -878,7 +896,7 @@ async def update_negotiation_scenario_info(session_id: str, scenario_info: str):
     if not session:
         return {"error": "Session not found", "session_id": session_id}
 
-    scenario_para = generate_scenario(scenario_info)
+    scenario_para = await agenerate_scenario(scenario_info)
     logger.info(f"Session {session_id}: Scenario info updated")
 
     return {